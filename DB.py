@@ -1,60 +1,199 @@
-import bcrypt
 import pymysql
+from pymysql.constants import ER
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv, find_dotenv
+import hashlib
+import json
 import os
 import re
+import secrets
+from passwords import PasswordHasher
+from cache import LookupCache, MISSING
+from throttle import AttemptThrottle
+from metrics import registry, timed
 
 # Загружаем переменные окружения из .env файла
 load_dotenv(find_dotenv())
 
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+# Число строк в одной транзакции массовых операций
+BULK_CHUNK_SIZE = int(os.getenv("db_bulk_chunk", 500))
+# Срок жизни сессии входа
+SESSION_TTL = timedelta(days=int(os.getenv("session_ttl_days", 30)))
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул подключений к MySQL с проверкой и переподключением.
+    """
+    def __init__(self, size=5, timeout=10, **connect_kwargs):
+        """
+        Подключения создаются лениво, но не больше size одновременно.
+        """
+        self.size = size
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        return pymysql.connect(cursorclass=pymysql.cursors.DictCursor, **self.connect_kwargs)
+
+    def _checkout(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise pymysql.OperationalError("Нет свободных подключений к базе данных.")
+        try:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            # Подключение могло быть закрыто сервером по wait_timeout
+            connection.ping(reconnect=True)
+            return connection
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _checkin(self, connection, broken=False):
+        try:
+            if not broken:
+                # Завершаем открытую транзакцию, чтобы следующий пользователь не видел старый снимок данных
+                connection.rollback()
+                self.idle.put(connection)
+                return
+        except pymysql.Error:
+            pass
+        finally:
+            self.slots.release()
+        try:
+            connection.close()
+        except pymysql.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Взять подключение из пула на время блока with.
+        При ошибке незавершенная транзакция откатывается, а сломанное подключение закрывается.
+        """
+        connection = self._checkout()
+        broken = False
+        try:
+            yield connection
+        except pymysql.OperationalError:
+            broken = True
+            raise
+        except Exception:
+            try:
+                connection.rollback()
+            except pymysql.Error:
+                broken = True
+            raise
+        finally:
+            self._checkin(connection, broken)
+
+    def close(self):
+        """
+        Закрыть все свободные подключения.
+        """
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+            except pymysql.Error:
+                pass
+
+
 class MySQL:
-    def __init__(self, host, port, user, password, db_name):
+    def __init__(self, host, port, user, password, db_name, pool_size=None):
         """
-        Инициализация подключения к базе данных MySQL
+        Инициализация пула подключений к базе данных MySQL
         """
-        self.connection = pymysql.connect(
+        self.pool = ConnectionPool(
+            size=pool_size or int(os.getenv("db_pool_size", 5)),
             host=host,
             port=port,
             user=user,
             password=password,
             database=db_name,
-            cursorclass=pymysql.cursors.DictCursor
         )
+        self.hasher = PasswordHasher(
+            rounds=int(os.getenv("bcrypt_rounds", 12)),
+            workers=int(os.getenv("bcrypt_workers", 2)),
+        )
+        # Кэш поиска пользователя по email (id и хэш пароля) и отрицательный кэш неизвестных email.
+        # Кэш свой у каждого процесса: срок жизни ограничивает устаревание после изменений в других процессах
+        self.users = LookupCache(
+            max_entries=int(os.getenv("user_cache_size", 10000)),
+            ttl=int(os.getenv("user_cache_ttl", 300)),
+            negative_ttl=int(os.getenv("user_negative_ttl", 60)),
+        )
+        # Ограничение неудачных попыток входа: до базы и bcrypt доходят только разрешенные попытки
+        login_window = int(os.getenv("login_window", 300))
+        self.email_throttle = AttemptThrottle(int(os.getenv("login_email_limit", 5)), login_window)
+        self.ip_throttle = AttemptThrottle(int(os.getenv("login_ip_limit", 20)), login_window)
+        registry.add_collector(self.collect_metrics)
 
-    def create_users_table(self):
+    def collect_metrics(self):
+        users = self.users.stats()
+        return {
+            "user_cache_hits_total": users["hits"],
+            "user_cache_negative_hits_total": users["negative_hits"],
+            "user_cache_misses_total": users["misses"],
+            "user_cache_entries": users["entries"],
+        }
+
+    def _find_user(self, email):
+        """
+        Пользователь {'id', 'password'} по email через кэш поиска или None.
+        Ошибки pymysql не перехватываются.
         """
-        Создание таблицы пользователей, если она еще не существует.
+        key = email.lower()
+        cached = self.users.get(key)
+        if cached is MISSING:
+            return None
+        if cached is not None:
+            return cached
+        with self.pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT id, password FROM `users` WHERE email = %s", (email,))
+            result = cursor.fetchone()
+        self.users.set(key, {"id": result['id'], "password": result['password']} if result else MISSING)
+        return result
+
+    @timed("db_call", method="migrate")
+    def migrate(self):
         """
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS `users` (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            email VARCHAR(255) NOT NULL UNIQUE,
-            password VARCHAR(255) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+        Применить недостающие миграции схемы (migrations.py). Возвращает список примененных версий.
         """
+        from migrations import migrate
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(create_table_query)
-                self.connection.commit()
-                print("Таблица 'users' успешно создана.")
-        except pymysql.MySQLError as e:
-            print(f"Ошибка при создании таблицы: {e}")
+            return migrate(self)
+        except (pymysql.MySQLError, RuntimeError) as e:
+            print(f"Ошибка при применении миграций: {e}")
+            return []
+
+    def create_users_table(self):
+        """
+        Создание таблицы пользователей, если она еще не существует (схема ведется миграциями).
+        """
+        self.migrate()
 
+    @timed("db_call", method="get_user_id_by_email")
     def get_user_id_by_email(self, email):
         """
         Получить ID пользователя по email.
         """
-        query = "SELECT id FROM `users` WHERE email = %s"
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query, (email,))
-                result = cursor.fetchone()
-                if result:
-                    return result['id']
-                else:
-                    print(f"Пользователь с email {email} не найден.")
-                    return None
+            result = self._find_user(email)
+            if result:
+                return result['id']
+            else:
+                print(f"Пользователь с email {email} не найден.")
+                return None
         except pymysql.MySQLError as e:
             print(f"Ошибка при получении id пользователя: {e}")
             return None
@@ -63,68 +202,417 @@ class MySQL:
         """
         Хэширование пароля с использованием bcrypt.
         """
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed_password
+        return self.hasher.hash(password)
 
+    @timed("db_call", method="add_user")
     def add_user(self, email, password):
         """
         Добавить нового пользователя в базу данных.
         """
         # Проверка формата email
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        if not EMAIL_PATTERN.match(email):
             print("Неверный формат email.")
             return False
 
         hashed_password = self.hash_password(password)
-        check_query = "SELECT COUNT(*) AS count FROM `users` WHERE email = %s"
+        # Уникальность email проверяет сама база: отдельный SELECT перед INSERT не защищает от гонки
         insert_query = "INSERT INTO `users` (email, password) VALUES (%s, %s)"
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(check_query, (email,))
-                result = cursor.fetchone()
-                if result['count'] > 0:
-                    print(f"Пользователь с email {email} уже существует.")
-                    return False
+            with self.pool.connection() as connection, connection.cursor() as cursor:
                 cursor.execute(insert_query, (email, hashed_password))
-                self.connection.commit()
+                connection.commit()
+                self.users.invalidate(email.lower())
                 print("Пользователь успешно добавлен.")
                 return True
+        except pymysql.IntegrityError as e:
+            if e.args[0] == ER.DUP_ENTRY:
+                self.users.invalidate(email.lower())
+                print(f"Пользователь с email {email} уже существует.")
+            else:
+                print(f"Ошибка при добавлении пользователя: {e}")
+            return False
         except pymysql.MySQLError as e:
             print(f"Ошибка при добавлении пользователя: {e}")
             return False
 
-    def verify_password(self, email, password):
+    @timed("db_call", method="add_users")
+    def add_users(self, users, update_existing=False, chunk_size=None):
         """
-        Проверка пароля пользователя.
+        Массовое добавление пользователей: список пар (email, пароль).
+        Строки записываются многострочными INSERT транзакциями по chunk_size строк. Существующие email
+        пропускаются или, если update_existing, получают новый пароль; хэшируются (параллельно в пуле bcrypt)
+        только пароли записываемых строк. Возвращает отчет по каждой строке в исходном порядке:
+        {"email", "status": added | updated | exists | invalid | error, "message"}.
         """
-        query = "SELECT password FROM `users` WHERE email = %s"
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        report = [{"email": email, "status": None, "message": ""} for email, _ in users]
+
+        # Уникальный индекс email сравнивает адреса без учета регистра, поэтому и повторы ищутся без него
+        valid = []
+        seen = set()
+        for index, (email, password) in enumerate(users):
+            if not EMAIL_PATTERN.match(email or ""):
+                report[index].update(status="invalid", message="Неверный формат email.")
+            elif email.lower() in seen:
+                report[index].update(status="invalid", message="Email повторяется в списке.")
+            elif not password:
+                report[index].update(status="invalid", message="Пустой пароль.")
+            else:
+                seen.add(email.lower())
+                valid.append(index)
+
+        rows = [(index, *users[index]) for index in valid]
+        for start in range(0, len(rows), chunk_size):
+            self._insert_users_chunk(rows[start:start + chunk_size], report, update_existing)
+        for _, email, _ in rows:
+            self.users.invalidate(email.lower())
+
+        counts = {}
+        for row in report:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        print(f"Массовое добавление пользователей: {counts}")
+        return report
+
+    def _hash_rows(self, rows, hashed):
+        # Хэши паролей строк (индекс, email, пароль), которых еще нет в hashed ({индекс: хэш})
+        rows = [row for row in rows if row[0] not in hashed]
+        hashed_passwords = self.hasher.hash_many([password for _, _, password in rows])
+        hashed.update((index, password.decode('utf-8')) for (index, _, _), password in zip(rows, hashed_passwords))
+
+    def _insert_users_chunk(self, rows, report, update_existing):
+        # Существующие email блокируются в той же транзакции, поэтому отчет совпадает с тем, что записано.
+        # bcrypt - самая дорогая часть, поэтому пароли хэшируются после проверки и только для записываемых строк
+        placeholders = ", ".join(["%s"] * len(rows))
+        select_query = f"SELECT email FROM `users` WHERE email IN ({placeholders}) FOR UPDATE"
+        insert_query = "INSERT INTO `users` (email, password) VALUES (%s, %s) ON DUPLICATE KEY UPDATE "
+        insert_query += "password = VALUES(password)" if update_existing else "id = id"
+        hashed = {}
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query, (email,))
-                result = cursor.fetchone()
-                if result:
-                    stored_password = result['password'].encode('utf-8')
-                    if bcrypt.checkpw(password.encode('utf-8'), stored_password):
-                        print("Пароль верный.")
-                        return True
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(select_query, [email for _, email, _ in rows])
+                existing = {row['email'].lower() for row in cursor.fetchall()}
+                to_write = rows if update_existing else [row for row in rows if row[1].lower() not in existing]
+                if to_write:
+                    self._hash_rows(to_write, hashed)
+                    cursor.executemany(insert_query, [(email, hashed[index]) for index, email, _ in to_write])
+                connection.commit()
+        except pymysql.MySQLError as e:
+            # Транзакция части откатывается целиком; строки повторяются по одной, чтобы найти проблемные
+            print(f"Ошибка при массовом добавлении пользователей, построчная запись: {e}")
+            self._hash_rows(rows, hashed)
+            for index, email, _ in rows:
+                self._insert_user_row((index, email, hashed[index]), report, update_existing)
+            return
+
+        for index, email, _ in rows:
+            if email.lower() in existing:
+                report[index]["status"] = "updated" if update_existing else "exists"
+                report[index]["message"] = "Пароль обновлен." if update_existing else "Пользователь уже существует."
+            else:
+                report[index]["status"] = "added"
+
+    def _insert_user_row(self, row, report, update_existing):
+        index, email, hashed_password = row
+        insert_query = "INSERT INTO `users` (email, password) VALUES (%s, %s)"
+        update_query = "UPDATE `users` SET password = %s WHERE email = %s"
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                try:
+                    cursor.execute(insert_query, (email, hashed_password))
+                    report[index]["status"] = "added"
+                except pymysql.IntegrityError as e:
+                    if e.args[0] != ER.DUP_ENTRY:
+                        raise
+                    if update_existing:
+                        cursor.execute(update_query, (hashed_password, email))
+                        report[index].update(status="updated", message="Пароль обновлен.")
                     else:
-                        print("Неверный пароль.")
-                        return False
+                        report[index].update(status="exists", message="Пользователь уже существует.")
+                connection.commit()
+        except pymysql.MySQLError as e:
+            report[index].update(status="error", message=str(e))
+
+    def login_retry_after(self, email, ip=None):
+        """
+        Сколько секунд вход для email или IP-адреса заблокирован после неудачных попыток (0 - разрешен).
+        """
+        return max(self.email_throttle.retry_after(email.lower()), self.ip_throttle.retry_after(ip))
+
+    @timed("db_call", method="authenticate")
+    def authenticate(self, email, password, ip=None):
+        """
+        Проверка пароля пользователя, возвращает его ID или None.
+        Если стоимость хэша отличается от текущей настройки, пароль перехэшируется.
+        Неудачные попытки считаются по email и IP-адресу; заблокированная попытка отклоняется
+        без обращения к базе и без bcrypt.
+        """
+        key = email.lower()
+        retry_after = self.login_retry_after(email, ip)
+        if retry_after:
+            registry.inc("login_throttled")
+            print(f"Слишком много неудачных попыток входа, повторите через {retry_after:.0f} с.")
+            return None
+        try:
+            result = self._find_user(email)
+            if result:
+                stored_password = result['password'].encode('utf-8')
+                if self.hasher.verify(password, stored_password):
+                    print("Пароль верный.")
+                    self.email_throttle.reset(key)
+                    if self.hasher.needs_rehash(stored_password):
+                        self.rehash_password(result['id'], password)
+                    return result['id']
                 else:
-                    print("Пользователь с таким email не найден.")
-                    return False
+                    print("Неверный пароль.")
+            else:
+                print("Пользователь с таким email не найден.")
+            self.email_throttle.failure(key)
+            self.ip_throttle.failure(ip)
+            return None
         except pymysql.MySQLError as e:
             print(f"Ошибка при проверке пароля: {e}")
+            return None
+
+    def verify_password(self, email, password, ip=None):
+        """
+        Проверка пароля пользователя (True/False).
+        """
+        return self.authenticate(email, password, ip) is not None
+
+    @staticmethod
+    def _token_hash(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @timed("db_call", method="create_session")
+    def create_session(self, user_id, ttl=None):
+        """
+        Создать сессию входа пользователя и вернуть ее токен (None при ошибке).
+        В базе хранится только SHA-256 токена; попутно удаляется порция истекших сессий.
+        """
+        token = secrets.token_urlsafe(32)
+        expires_at = datetime.now() + (ttl or SESSION_TTL)
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO `sessions` (token_hash, user_id, expires_at) VALUES (%s, %s, %s)",
+                    (self._token_hash(token), user_id, expires_at),
+                )
+                connection.commit()
+            self.purge_expired_sessions()
+            return token
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при создании сессии: {e}")
+            return None
+
+    @timed("db_call", method="get_session_user")
+    def get_session_user(self, token):
+        """
+        ID пользователя по токену действующей сессии или None: одно чтение по первичному ключу.
+        """
+        if not token:
+            return None
+        query = "SELECT user_id FROM `sessions` WHERE token_hash = %s AND expires_at > NOW()"
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, (self._token_hash(token),))
+                result = cursor.fetchone()
+            return result['user_id'] if result else None
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при проверке сессии: {e}")
+            return None
+
+    @timed("db_call", method="rotate_session")
+    def rotate_session(self, token, ttl=None):
+        """
+        Заменить действующую сессию новой с новым токеном и сроком: (ID пользователя, новый токен)
+        или (None, None), если сессия не найдена или истекла. Старый токен после этого недействителен.
+        """
+        if not token:
+            return None, None
+        new_token = secrets.token_urlsafe(32)
+        expires_at = datetime.now() + (ttl or SESSION_TTL)
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT user_id FROM `sessions` WHERE token_hash = %s AND expires_at > NOW() FOR UPDATE",
+                    (self._token_hash(token),),
+                )
+                result = cursor.fetchone()
+                if not result:
+                    connection.commit()
+                    return None, None
+                cursor.execute("DELETE FROM `sessions` WHERE token_hash = %s", (self._token_hash(token),))
+                cursor.execute(
+                    "INSERT INTO `sessions` (token_hash, user_id, expires_at) VALUES (%s, %s, %s)",
+                    (self._token_hash(new_token), result['user_id'], expires_at),
+                )
+                connection.commit()
+            return result['user_id'], new_token
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при обновлении сессии: {e}")
+            return None, None
+
+    @timed("db_call", method="delete_session")
+    def delete_session(self, token):
+        """
+        Завершить сессию по токену.
+        """
+        if not token:
+            return
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute("DELETE FROM `sessions` WHERE token_hash = %s", (self._token_hash(token),))
+                connection.commit()
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при удалении сессии: {e}")
+
+    @timed("db_call", method="purge_expired_sessions")
+    def purge_expired_sessions(self, limit=1000):
+        """
+        Удалить до limit истекших сессий (диапазон по индексу expires_at). Возвращает число удаленных строк.
+        """
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                deleted = cursor.execute("DELETE FROM `sessions` WHERE expires_at <= NOW() LIMIT %s", (limit,))
+                connection.commit()
+            return deleted
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при удалении истекших сессий: {e}")
+            return 0
+
+    @staticmethod
+    def _saved_query(row):
+        return {**row, "instruments": json.loads(row['instruments']), "statistics": json.loads(row['statistics'])}
+
+    @timed("db_call", method="save_query")
+    def save_query(self, user_id, name, instruments, statistics, start_date=None, end_date=None, range_days=None):
+        """
+        Сохранить именованный запрос пользователя: инструменты, период (start_date - end_date
+        или последние range_days дней) и показатели. Запрос с тем же именем перезаписывается,
+        его устаревший снимок удаляется. Возвращает ID запроса или None при ошибке.
+        """
+        query = """
+        INSERT INTO `saved_queries` (user_id, name, instruments, start_date, end_date, range_days, statistics)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id), instruments = VALUES(instruments),
+            start_date = VALUES(start_date), end_date = VALUES(end_date), range_days = VALUES(range_days),
+            statistics = VALUES(statistics)
+        """
+        params = (user_id, name, json.dumps(list(instruments), ensure_ascii=False), start_date, end_date,
+                  range_days, json.dumps(list(statistics)))
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, params)
+                query_id = cursor.lastrowid
+                cursor.execute("DELETE FROM `dashboard_snapshots` WHERE query_id = %s", (query_id,))
+                connection.commit()
+            return query_id
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при сохранении запроса: {e}")
+            return None
+
+    @timed("db_call", method="get_saved_queries")
+    def get_saved_queries(self, user_id=None):
+        """
+        Сохраненные запросы пользователя (все запросы, если user_id не задан) с датой расчета снимка
+        (snapshot_at, None - снимка нет).
+        """
+        query = """
+        SELECT q.id, q.user_id, q.name, q.instruments, q.start_date, q.end_date, q.range_days, q.statistics,
+               s.computed_at AS snapshot_at
+        FROM `saved_queries` q LEFT JOIN `dashboard_snapshots` s ON s.query_id = q.id
+        """
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                if user_id is None:
+                    cursor.execute(query + " ORDER BY q.id")
+                else:
+                    cursor.execute(query + " WHERE q.user_id = %s ORDER BY q.name", (user_id,))
+                return [self._saved_query(row) for row in cursor.fetchall()]
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при получении сохраненных запросов: {e}")
+            return []
+
+    @timed("db_call", method="delete_saved_query")
+    def delete_saved_query(self, query_id, user_id):
+        """
+        Удалить сохраненный запрос пользователя вместе с его снимком.
+        """
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute("DELETE FROM `saved_queries` WHERE id = %s AND user_id = %s", (query_id, user_id))
+                connection.commit()
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при удалении запроса: {e}")
+
+    @timed("db_call", method="save_snapshot")
+    def save_snapshot(self, query_id, snapshot):
+        """
+        Сохранить готовый результат запроса: {"start_date", "end_date", "statistics", "failed_windows",
+        "chart", "series"}.
+        """
+        query = """
+        INSERT INTO `dashboard_snapshots` (query_id, start_date, end_date, statistics, failed_windows, chart, series)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE start_date = VALUES(start_date), end_date = VALUES(end_date),
+            statistics = VALUES(statistics), failed_windows = VALUES(failed_windows), chart = VALUES(chart),
+            series = VALUES(series), computed_at = CURRENT_TIMESTAMP
+        """
+        params = (query_id, snapshot['start_date'], snapshot['end_date'],
+                  json.dumps(snapshot['statistics'], ensure_ascii=False), snapshot['failed_windows'],
+                  snapshot['chart'], snapshot['series'])
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, params)
+                connection.commit()
+            return True
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при сохранении снимка: {e}")
             return False
 
+    @timed("db_call", method="get_snapshot")
+    def get_snapshot(self, query_id):
+        """
+        Готовый результат запроса (чтение по первичному ключу) или None.
+        """
+        query = """
+        SELECT start_date, end_date, statistics, failed_windows, chart, series, computed_at
+        FROM `dashboard_snapshots` WHERE query_id = %s
+        """
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, (query_id,))
+                result = cursor.fetchone()
+            if result:
+                result['statistics'] = json.loads(result['statistics'])
+            return result
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при получении снимка: {e}")
+            return None
+
+    @timed("db_call", method="rehash_password")
+    def rehash_password(self, user_id, password):
+        """
+        Сохранить хэш пароля, вычисленный с текущей стоимостью.
+        """
+        query = "UPDATE `users` SET password = %s WHERE id = %s"
+        try:
+            hashed_password = self.hash_password(password)
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, (hashed_password, user_id))
+                connection.commit()
+            self.users.invalidate_where(lambda user: user['id'] == user_id)
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при обновлении хэша пароля: {e}")
+
+    @timed("db_call", method="get_user_info")
     def get_user_info(self, user_id):
         """
         Получить информацию о пользователе по его ID.
         """
         query = "SELECT email, created_at FROM `users` WHERE id = %s"
         try:
-            with self.connection.cursor() as cursor:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
                 cursor.execute(query, (user_id,))
                 result = cursor.fetchone()
                 if result:
@@ -137,19 +625,44 @@ class MySQL:
             print(f"Ошибка при получении информации о пользователе: {e}")
             return None
 
+    @timed("db_call", method="del_user")
     def del_user(self, user_id):
         """
         Удалить пользователя по ID.
         """
         query = "DELETE FROM `users` WHERE id = %s"
         try:
-            with self.connection.cursor() as cursor:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
                 cursor.execute(query, (user_id,))
-            self.connection.commit()
+                connection.commit()
+            self.users.invalidate_where(lambda user: user['id'] == user_id)
             print(f"Пользователь с ID {user_id} удален.")
         except pymysql.MySQLError as e:
             print(f"Ошибка при удалении пользователя: {e}")
 
+    @timed("db_call", method="del_users")
+    def del_users(self, user_ids, chunk_size=None):
+        """
+        Удалить пользователей по списку ID: один DELETE ... IN на транзакцию из chunk_size ID.
+        Возвращает число удаленных строк.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        user_ids = list(user_ids)
+        deleted = 0
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                for start in range(0, len(user_ids), chunk_size):
+                    chunk = user_ids[start:start + chunk_size]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    deleted += cursor.execute(f"DELETE FROM `users` WHERE id IN ({placeholders})", chunk)
+                    connection.commit()
+            print(f"Удалено пользователей: {deleted}")
+        except pymysql.MySQLError as e:
+            print(f"Ошибка при удалении пользователей: {e}")
+        removed = set(user_ids)
+        self.users.invalidate_where(lambda user: user['id'] in removed)
+        return deleted
+
     @staticmethod
     def check_password_strength(password):
         """
@@ -169,3 +682,272 @@ class MySQL:
         if ' ' in password:
             return False, "Пароль не должен содержать пробелы."
         return True, "Пароль надежен."
+
+
+class RatesStore:
+    """
+    Локальное хранилище временных рядов НБРБ (цены металлов и курсы валют) в SQLite.
+    Ключ хранения - инструмент (URL ресурса API) и дата.
+    """
+    def __init__(self, path):
+        """
+        Открытие (или создание) файла хранилища.
+        """
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.create_tables()
+
+    def create_tables(self):
+        """
+        Создание таблиц значений и загруженных диапазонов, если они еще не существуют.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS rates (
+                instrument TEXT NOT NULL,
+                date TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (instrument, date)
+            )
+            """)
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS coverage (
+                instrument TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL
+            )
+            """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS coverage_instrument ON coverage (instrument)"
+            )
+            # Материализованные агрегаты (см. aggregates.py): статистика за стандартные периоды,
+            # недельные и месячные OHLC, скользящие средние
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS range_stats (
+                instrument TEXT NOT NULL,
+                range_name TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                mean REAL NOT NULL,
+                median REAL NOT NULL,
+                minimum REAL NOT NULL,
+                maximum REAL NOT NULL,
+                PRIMARY KEY (instrument, range_name)
+            )
+            """)
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS ohlc (
+                instrument TEXT NOT NULL,
+                period TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                mean REAL NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (instrument, period, period_start)
+            )
+            """)
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS rolling_means (
+                instrument TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (instrument, window, date)
+            )
+            """)
+
+    def _get_coverage(self, instrument):
+        rows = self.connection.execute(
+            "SELECT start_date, end_date FROM coverage WHERE instrument = ? ORDER BY start_date",
+            (instrument,)
+        ).fetchall()
+        return [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in rows]
+
+    def missing_ranges(self, instrument, start_date, end_date):
+        """
+        Получить список диапазонов дат (включительно), которых еще нет в хранилище.
+        """
+        with self.lock:
+            coverage = self._get_coverage(instrument)
+
+        missing = []
+        current_date = start_date
+        for covered_start, covered_end in coverage:
+            if covered_end < current_date:
+                continue
+            if covered_start > end_date:
+                break
+            if covered_start > current_date:
+                missing.append((current_date, covered_start - timedelta(days=1)))
+            current_date = max(current_date, covered_end + timedelta(days=1))
+            if current_date > end_date:
+                break
+        if current_date <= end_date:
+            missing.append((current_date, end_date))
+        return missing
+
+    def save(self, instrument, start_date, end_date, data, value_key):
+        """
+        Сохранить ответ API за диапазон дат и отметить диапазон как загруженный.
+        Сегодняшний и будущие дни не отмечаются: данные за них могут еще появиться.
+        Возвращает число новых или изменившихся строк: повторно полученные те же значения не перезаписываются.
+        """
+        rows = [(instrument, item['Date'][:10], item[value_key]) for item in data]
+        covered_end = min(end_date, date.today() - timedelta(days=1))
+        try:
+            with self.lock, self.connection:
+                changes_before = self.connection.total_changes
+                self.connection.executemany(
+                    "INSERT INTO rates (instrument, date, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (instrument, date) DO UPDATE SET value = excluded.value "
+                    "WHERE value != excluded.value",
+                    rows
+                )
+                written = self.connection.total_changes - changes_before
+                if covered_end >= start_date:
+                    self._add_coverage(instrument, start_date, covered_end)
+            return written
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении данных в хранилище: {e}")
+            return 0
+
+    def _add_coverage(self, instrument, start_date, end_date):
+        # Объединяем пересекающиеся и соседние диапазоны, чтобы таблица не разрасталась
+        ranges = self._get_coverage(instrument) + [(start_date, end_date)]
+        ranges.sort()
+        merged = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            last_start, last_end = merged[-1]
+            if range_start <= last_end + timedelta(days=1):
+                merged[-1] = (last_start, max(last_end, range_end))
+            else:
+                merged.append((range_start, range_end))
+
+        self.connection.execute("DELETE FROM coverage WHERE instrument = ?", (instrument,))
+        self.connection.executemany(
+            "INSERT INTO coverage (instrument, start_date, end_date) VALUES (?, ?, ?)",
+            [(instrument, start.isoformat(), end.isoformat()) for start, end in merged]
+        )
+
+    def latest_date(self, instrument):
+        """
+        Последняя дата, за которую в хранилище есть значение, или None.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT MAX(date) FROM rates WHERE instrument = ?", (instrument,)
+            ).fetchone()
+        return date.fromisoformat(row[0]) if row[0] else None
+
+    def load(self, instrument, start_date, end_date):
+        """
+        Прочитать значения за диапазон дат, упорядоченные по дате: (список дат 'YYYY-MM-DD', список значений).
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT date, value FROM rates WHERE instrument = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (instrument, start_date.isoformat(), end_date.isoformat())
+            ).fetchall()
+        if not rows:
+            return [], []
+        dates, values = zip(*rows)
+        return list(dates), list(values)
+
+    def latest_segment(self, instrument):
+        """
+        Последний непрерывный загруженный диапазон инструмента: (начало, конец) или None.
+        Сегодняшние и опубликованные заранее значения в покрытие не входят; они продолжают диапазон,
+        только если покрытие доходит до вчерашнего дня. Иначе между ними и покрытием пропуск, и диапазон
+        заканчивается покрытием.
+        """
+        with self.lock:
+            coverage = self._get_coverage(instrument)
+        latest = self.latest_date(instrument)
+        if not coverage or latest is None:
+            return None
+        segment_start, segment_end = coverage[-1]
+        if latest > segment_end and segment_end >= date.today() - timedelta(days=1):
+            segment_end = latest
+        return segment_start, segment_end
+
+    def save_aggregates(self, instrument, since, range_rows, ohlc_rows, rolling_rows):
+        """
+        Записать пересчитанные агрегаты: статистика за периоды заменяется целиком,
+        OHLC и скользящие средние - начиная с since (начало самого раннего затронутого периода).
+        """
+        since = since.isoformat()
+        try:
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM range_stats WHERE instrument = ?", (instrument,))
+                self.connection.executemany(
+                    "INSERT INTO range_stats (instrument, range_name, start_date, end_date, count, mean, median, "
+                    "minimum, maximum) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(instrument, *row) for row in range_rows]
+                )
+                self.connection.execute(
+                    "DELETE FROM ohlc WHERE instrument = ? AND period_start >= ?", (instrument, since)
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO ohlc (instrument, period, period_start, open, high, low, close, mean, "
+                    "count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(instrument, *row) for row in ohlc_rows]
+                )
+                self.connection.execute(
+                    "DELETE FROM rolling_means WHERE instrument = ? AND date >= ?", (instrument, since)
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO rolling_means (instrument, window, date, value) VALUES (?, ?, ?, ?)",
+                    [(instrument, *row) for row in rolling_rows]
+                )
+        except sqlite3.Error as e:
+            print(f"Ошибка при сохранении агрегатов в хранилище: {e}")
+
+    def range_statistics(self, instrument):
+        """
+        Статистика за стандартные периоды: {код периода: {start, end, count, mean, median, minimum, maximum}}.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT range_name, start_date, end_date, count, mean, median, minimum, maximum "
+                "FROM range_stats WHERE instrument = ?",
+                (instrument,)
+            ).fetchall()
+        return {
+            name: {
+                "start": date.fromisoformat(start), "end": date.fromisoformat(end), "count": count,
+                "mean": mean, "median": median, "minimum": minimum, "maximum": maximum,
+            }
+            for name, start, end, count, mean, median, minimum, maximum in rows
+        }
+
+    def load_ohlc(self, instrument, period, start_date, end_date):
+        """
+        Недельные ('week') или месячные ('month') агрегаты за диапазон:
+        список (начало периода, open, high, low, close, mean, count).
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT period_start, open, high, low, close, mean, count FROM ohlc "
+                "WHERE instrument = ? AND period = ? AND period_start BETWEEN ? AND ? ORDER BY period_start",
+                (instrument, period, start_date.isoformat(), end_date.isoformat())
+            ).fetchall()
+
+    def load_rolling_means(self, instrument, window, start_date, end_date):
+        """
+        Скользящее среднее за window наблюдений: (список дат 'YYYY-MM-DD', список значений).
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT date, value FROM rolling_means WHERE instrument = ? AND window = ? "
+                "AND date BETWEEN ? AND ? ORDER BY date",
+                (instrument, window, start_date.isoformat(), end_date.isoformat())
+            ).fetchall()
+        if not rows:
+            return [], []
+        dates, values = zip(*rows)
+        return list(dates), list(values)
@@ -0,0 +1,140 @@
+"""
+Материализованные агрегаты рядов НБРБ в локальном хранилище: статистика за стандартные периоды
+(месяц, квартал, год, 5 лет), недельные и месячные OHLC и скользящие средние.
+Пересчитываются после загрузки новых дней (service.load_series, service.load_many_series, sync.py),
+поэтому статистика за стандартный период читается одной строкой по первичному ключу, без обхода дневного ряда.
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from service import normalize_series, store
+from stats_engine import summarize
+
+# Стандартные периоды: код -> (длина в днях, подпись)
+STANDARD_RANGES = {
+    "1m": (30, "Месяц"),
+    "3m": (91, "Квартал"),
+    "1y": (365, "Год"),
+    "5y": (1826, "5 лет"),
+}
+# Окна скользящих средних, число наблюдений
+ROLLING_WINDOWS = (7, 30, 90)
+# Наибольший интервал между соседними наблюдениями без пропуска данных (выходные и праздники НБРБ)
+MAX_GAP_DAYS = 7
+# Начало периода OHLC: неделя с понедельника, календарный месяц
+MONDAY_OFFSET = np.timedelta64(4, "D")  # 1970-01-01 (начало недель numpy) - четверг
+
+
+def period_starts(dates, period):
+    """
+    Дата начала недели ('week') или месяца ('month') для каждой даты.
+    """
+    if period == "week":
+        return (dates - MONDAY_OFFSET).astype("datetime64[W]").astype("datetime64[D]") + MONDAY_OFFSET
+    return dates.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def ohlc_rows(dates, values, period):
+    """
+    OHLC по периодам упорядоченного ряда: список (начало периода, open, high, low, close, mean, count).
+    """
+    if not values.size:
+        return []
+    starts = period_starts(dates, period)
+    first = np.flatnonzero(np.concatenate([[True], starts[1:] != starts[:-1]]))
+    last = np.concatenate([first[1:] - 1, [values.size - 1]])
+    counts = last - first + 1
+    means = np.add.reduceat(values, first) / counts
+    return list(zip(
+        [period] * first.size,
+        np.datetime_as_string(starts[first]).tolist(),
+        values[first].tolist(),
+        np.maximum.reduceat(values, first).tolist(),
+        np.minimum.reduceat(values, first).tolist(),
+        values[last].tolist(),
+        means.tolist(),
+        counts.tolist(),
+    ))
+
+
+def gaps(dates):
+    """
+    Признак пропуска данных перед каждым наблюдением (для первого - False).
+    """
+    return np.concatenate([[False], np.diff(dates) > np.timedelta64(MAX_GAP_DAYS, "D")])
+
+
+def rolling_rows(dates, values, window):
+    """
+    Скользящее среднее за window наблюдений: список (окно, дата, значение) без начальных неполных окон
+    и без окон, внутри которых пропуск данных.
+    """
+    if values.size < window:
+        return []
+    sums = np.cumsum(np.concatenate([[0.0], values]))
+    means = (sums[window:] - sums[:-window]) / window
+    # Пропуск перед первым наблюдением окна окну не мешает, учитываются только пропуски внутри
+    gap_counts = np.cumsum(gaps(dates))
+    valid = gap_counts[window - 1:] == gap_counts[:values.size - window + 1]
+    return list(zip([window] * int(valid.sum()), np.datetime_as_string(dates[window - 1:][valid]).tolist(),
+                    means[valid].tolist()))
+
+
+def range_rows(dates, values, segment_start, end_date):
+    """
+    Статистика за стандартные периоды, заканчивающиеся end_date. Период пропускается,
+    если загруженный ряд начинается позже его начала или внутри периода пропуск данных (неполные данные).
+    """
+    rows = []
+    for name, (days, _) in STANDARD_RANGES.items():
+        start_date = end_date - timedelta(days=days - 1)
+        if start_date < segment_start:
+            continue
+        inside = dates >= np.datetime64(start_date)
+        window = values[inside]
+        if not window.size:
+            continue
+        window_dates = np.concatenate([[np.datetime64(start_date)], dates[inside]])
+        if gaps(window_dates).any():
+            continue
+        summary = summarize(window)
+        rows.append((name, start_date.isoformat(), end_date.isoformat(), int(window.size),
+                     summary.mean, summary.median, summary.minimum, summary.maximum))
+    return rows
+
+
+def refresh(instrument, changed_from=None):
+    """
+    Пересчитать агрегаты инструмента после сохранения новых дней начиная с changed_from
+    (None - пересчитать весь непрерывный загруженный диапазон).
+    Ряд читается одним запросом, а переписываются только периоды и даты, затронутые новыми данными.
+    """
+    segment = store.latest_segment(instrument)
+    if segment is None:
+        return None
+    segment_start, segment_end = segment
+    series = normalize_series(*store.load(instrument, segment_start, segment_end))
+    dates, values = series["dates"], series["values"]
+    if not values.size:
+        return None
+
+    changed_from = max(changed_from or segment_start, segment_start)
+    changed = np.array([changed_from], dtype="datetime64[D]")
+    since = min(period_starts(changed, "week")[0], period_starts(changed, "month")[0]).item()
+
+    keep = dates >= np.datetime64(since)
+    ohlc = [row for period in ("week", "month") for row in ohlc_rows(dates, values, period)
+            if row[1] >= since.isoformat()]
+    rolling = [row for window in ROLLING_WINDOWS for row in rolling_rows(dates, values, window)
+               if row[1] >= since.isoformat()]
+    latest = dates[-1].item()
+    store.save_aggregates(instrument, since, range_rows(dates, values, segment_start, latest), ohlc, rolling)
+    return {"since": since, "points": int(keep.sum()), "ohlc": len(ohlc), "rolling": len(rolling)}
+
+
+def range_statistics(instrument):
+    """
+    Статистика за стандартные периоды из материализованной таблицы (чтение одной строки на период).
+    """
+    return store.range_statistics(instrument)
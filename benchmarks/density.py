@@ -0,0 +1,46 @@
+"""
+Сравнение точной и бинированной оценки плотности по времени и точности.
+Запуск из корня репозитория: python -m benchmarks.density
+"""
+import json
+import time
+
+import numpy as np
+
+from density import binned_density, exact_density
+
+SIZES = (1000, 5000, 20000, 100000)
+POINTS = 1000
+
+
+def measure(function, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    results = []
+    for size in SIZES:
+        # Синтетический ряд, похожий на дневные курсы: случайное блуждание
+        values = 100 + np.cumsum(rng.normal(size=size))
+        x = np.linspace(values.min(), values.max(), POINTS)
+        exact, exact_time = measure(exact_density, values, x)
+        binned, binned_time = measure(binned_density, values, x)
+        results.append({
+            "size": size,
+            "exact_seconds": exact_time,
+            "binned_seconds": binned_time,
+            "speedup": exact_time / binned_time,
+            "max_relative_error": float(np.abs(exact - binned).max() / exact.max()),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
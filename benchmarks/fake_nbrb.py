@@ -0,0 +1,104 @@
+"""
+Локальный стенд API НБРБ для бенчмарков: отдает синтетические ряды любой длины с настраиваемой задержкой.
+Поддерживаются ресурсы /bankingots/prices/<id> (поле Value) и /exrates/rates/dynamics/<id> (поле Cur_OfficialRate).
+Запуск отдельно: python -m benchmarks.fake_nbrb --port 8765 --latency 0.05
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROUTES = {
+    re.compile(r"^/bankingots/prices/(\d+)$"): "Value",
+    re.compile(r"^/exrates/rates/dynamics/(\d+)$"): "Cur_OfficialRate",
+}
+
+
+def synthetic_value(instrument, day):
+    """
+    Детерминированное значение инструмента на дату: тренд, сезонность и шум.
+    До деноминации 1 июля 2016 года значения в 10000 раз больше, как в настоящем API.
+    """
+    ordinal = day.toordinal()
+    value = 50 + instrument * 10 + ordinal % 3650 / 100 + 5 * math.sin(ordinal / 30) + (ordinal * 7919 % 100) / 100
+    if day < date(2016, 7, 1):
+        value *= 10000
+    return round(value, 4)
+
+
+class Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    requests_served = 0
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        for pattern, value_key in ROUTES.items():
+            match = pattern.match(parsed.path)
+            if match:
+                break
+        else:
+            self.send_error(404)
+            return
+
+        query = parse_qs(parsed.query)
+        try:
+            start = date.fromisoformat(query["startDate"][0][:10])
+            end = date.fromisoformat(query["endDate"][0][:10])
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+
+        time.sleep(self.latency)
+        instrument = int(match.group(1))
+        data = []
+        day = start
+        while day <= end:
+            # Металлы публикуются только по рабочим дням
+            if value_key == "Cur_OfficialRate" or day.weekday() < 5:
+                data.append({"Date": f"{day.isoformat()}T00:00:00", value_key: synthetic_value(instrument, day)})
+            day += timedelta(days=1)
+
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        type(self).requests_served += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0):
+    """
+    Запустить стенд в фоновом потоке. Возвращает (сервер, базовый адрес).
+    """
+    Handler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд API НБРБ")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунды")
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.latency)
+    print(f"Стенд API НБРБ: {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
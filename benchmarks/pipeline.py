@@ -0,0 +1,200 @@
+"""
+Бенчмарк конвейера данных на локальном стенде API НБРБ, без обращения к api.nbrb.by.
+Отдельно измеряются загрузка (fetch_data_in_chunks), чтение из локального хранилища, разбор,
+статистика, KDE, отрисовка, выгрузка и пропускная способность входа через MySQL.verify_password.
+Результат - JSON, который можно сохранять между релизами и сравнивать.
+Запуск из корня репозитория: python -m benchmarks.pipeline --years 1 5 20 --latency 0.05 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from benchmarks.fake_nbrb import start_server
+
+END_DATE = date(2024, 12, 31)
+
+
+def measure(function, *args, repeat=3):
+    """
+    Лучшее время из repeat запусков и результат последнего.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+class StandInCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return self.row
+
+
+class StandInConnection:
+    def __init__(self, row):
+        self.row = row
+
+    def cursor(self):
+        return StandInCursor(self.row)
+
+    def commit(self):
+        pass
+
+
+class StandInPool:
+    """
+    Заменитель пула MySQL: всегда возвращает одного пользователя с заданным хэшем пароля.
+    Позволяет измерить путь verify_password (пул, bcrypt) без сервера MySQL.
+    """
+    def __init__(self, hashed_password):
+        self.row = {"id": 1, "password": hashed_password}
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield StandInConnection(self.row)
+
+
+def bench_pipeline(years, repeat):
+    import service
+    import charts
+    from cache import ResponseCache
+    from density import binned_density, exact_density
+    from downsample import downsample
+    from export import csv_bytes, excel_bytes, parquet_bytes
+    from stats_engine import summarize
+
+    url, value_key = service.INSTRUMENTS["Золото"]
+    start_date = END_DATE.replace(year=END_DATE.year - years)
+
+    # Кэши выключены, чтобы каждый повтор измерял реальную работу этапа
+    service.response_cache = ResponseCache(max_bytes=0)
+    charts.chart_cache = charts.ChartCache(0)
+
+    (raw, _), fetch_time = measure(
+        service.fetch_data_in_chunks, url, start_date, END_DATE, value_key, repeat=repeat
+    )
+    service.load_series(url, start_date, END_DATE, value_key)
+    _, store_time = measure(service.load_series, url, start_date, END_DATE, value_key, repeat=repeat)
+    series, parse_time = measure(service.parse_response, raw, value_key, repeat=repeat)
+    dates, values = series["dates"], series["values"]
+    _, stats_time = measure(summarize, values, repeat=repeat)
+
+    grid = service.np.linspace(values.min(), values.max(), 1000)
+    _, kde_exact_time = measure(exact_density, values, grid, repeat=repeat)
+    _, kde_binned_time = measure(binned_density, values, grid, repeat=repeat)
+
+    def plot():
+        plot_dates, plot_values = downsample(dates, values, 1200)
+        return charts.line_png(plot_dates, plot_values, "Бенчмарк", "Цена", "Цена", "b")
+
+    _, plot_time = measure(plot, repeat=repeat)
+    _, excel_time = measure(excel_bytes, {"Данные": series}, repeat=repeat)
+    _, csv_time = measure(csv_bytes, {"Золото": series}, repeat=repeat)
+    _, parquet_time = measure(parquet_bytes, {"Золото": series}, repeat=repeat)
+
+    return {
+        "years": years,
+        "points": int(values.size),
+        "seconds": {
+            "fetch": fetch_time,
+            "store_read": store_time,
+            "parse": parse_time,
+            "statistics": stats_time,
+            "kde_exact": kde_exact_time,
+            "kde_binned": kde_binned_time,
+            "plot": plot_time,
+            "export_excel": excel_time,
+            "export_csv": csv_time,
+            "export_parquet": parquet_time,
+        },
+    }
+
+
+def bench_login(logins, concurrency):
+    from DB import MySQL
+
+    db = MySQL(host="localhost", port=3306, user="bench", password="bench", db_name="bench")
+    password = "Bench-password-1"
+    db.pool = StandInPool(db.hash_password(password).decode("utf-8"))
+
+    def login(_):
+        return db.verify_password("bench@example.com", password)
+
+    # verify_password печатает результат каждой проверки, в отчет это не попадает
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "bcrypt_rounds": db.hasher.rounds,
+        "seconds": elapsed,
+        "logins_per_second": logins / elapsed,
+        "all_verified": all(results),
+        "hasher": db.hasher.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера данных на локальном стенде НБРБ")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20], help="длины рядов в годах")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа стенда, секунды")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--login-concurrency", type=int, default=8)
+    parser.add_argument("--output", help="файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    workdir = tempfile.mkdtemp(prefix="nbrb_bench_")
+    # Окружение задается до импорта service: адрес стенда и отдельное хранилище
+    os.environ["nbrb_api"] = base_url
+    os.environ["nbrb_store"] = os.path.join(workdir, "store.sqlite3")
+    os.environ.pop("cache_path", None)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "latency": args.latency,
+        "pipeline": [bench_pipeline(years, args.repeat) for years in args.years],
+        "login": bench_login(args.logins, args.login_concurrency),
+    }
+    server.shutdown()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
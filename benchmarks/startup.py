@@ -0,0 +1,113 @@
+"""
+Время холодного старта: разбивка времени импорта (python -X importtime) для модулей, которые main.py
+загружает до формы входа, и отдельно для аналитического стека, который загружается при первом анализе.
+Если импорт стартового набора превышает бюджет или тянет тяжелые библиотеки аналитики, код выхода 1,
+поэтому отчет можно запускать в CI при сборке образа.
+Запуск из корня репозитория: python -m benchmarks.startup --budget 1.0 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+# Модули, которые main.py импортирует на уровне модуля (до формы входа)
+STARTUP_MODULES = ["streamlit", "dotenv", "DB", "metrics"]
+# Модули страниц анализа, импортируемые при первом открытии
+ANALYTICS_MODULES = ["service", "API", "compare", "charts", "export", "density", "scipy.stats"]
+# Библиотеки, которых не должно быть среди импортов стартового набора
+HEAVY_PACKAGES = {"numpy", "pandas", "matplotlib", "scipy", "xlsxwriter", "openpyxl", "pyarrow"}
+
+
+def import_times(modules, env):
+    """
+    Импорт modules в новом интерпретаторе. Возвращает список (модуль, собственное время, накопленное время, вложенность),
+    время в секундах.
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Вложенность импорта обозначается отступом имени модуля по два пробела на уровень
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return entries
+
+
+def breakdown(modules, env, repeat, top):
+    """
+    Лучший из repeat холодных импортов: общее время, время по пакетам верхнего уровня и самые дорогие модули.
+    """
+    best = None
+    for _ in range(repeat):
+        entries = import_times(modules, env)
+        total = sum(cumulative for _, _, cumulative, depth in entries if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, entries)
+    total, entries = best
+
+    packages = {}
+    for name, self_time, _, _ in entries:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_time
+    slowest = sorted(entries, key=lambda entry: entry[2], reverse=True)[:top]
+
+    return {
+        "modules": modules,
+        "seconds": total,
+        "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]),
+        "slowest": [{"module": name, "cumulative": cumulative} for name, _, cumulative, _ in slowest],
+        "heavy": sorted(HEAVY_PACKAGES & set(packages)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбивка времени импорта при холодном старте")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("startup_budget", 1.0)),
+                        help="допустимое время импорта стартового набора, секунды")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="сколько пакетов и модулей показывать")
+    parser.add_argument("--output", help="файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    # Импорт API создает локальное хранилище, поэтому оно переносится во временный каталог
+    env = dict(os.environ)
+    env["nbrb_store"] = os.path.join(tempfile.mkdtemp(prefix="nbrb_startup_"), "store.sqlite3")
+    env.pop("cache_path", None)
+    env.pop("metrics_port", None)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    startup = breakdown(STARTUP_MODULES, env, args.repeat, args.top)
+    analytics = breakdown(STARTUP_MODULES + ANALYTICS_MODULES, env, args.repeat, args.top)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "budget": args.budget,
+        "startup": startup,
+        "analytics": analytics,
+        "deferred_seconds": analytics["seconds"] - startup["seconds"],
+        "within_budget": startup["seconds"] <= args.budget and not startup["heavy"],
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0 if report["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
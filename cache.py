@@ -0,0 +1,223 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+
+class ResponseCache:
+    """
+    Кэш ответов API НБРБ с ключом (url, startDate, endDate).
+    Свежие окна (которые еще могут измениться) живут recent_ttl секунд,
+    исторические хранятся без срока. Вытеснение - LRU с ограничением по памяти.
+    Если задан path, кэш дополнительно хранится в SQLite и разделяется между процессами.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, recent_ttl=300, recent_days=3, path=None):
+        self.max_bytes = max_bytes
+        self.recent_ttl = recent_ttl
+        self.recent_days = recent_days
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            with self.connection:
+                self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    expires_at REAL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """)
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+                )
+
+    @staticmethod
+    def make_key(url, start_date, end_date):
+        return f"{url}|{start_date.isoformat()}|{end_date.isoformat()}"
+
+    def _expires_at(self, end_date):
+        # Окна, захватывающие последние дни, могут дополниться, поэтому живут недолго
+        if end_date >= date.today() - timedelta(days=self.recent_days):
+            return time.time() + self.recent_ttl
+        return None
+
+    def get(self, url, start_date, end_date):
+        """
+        Получить ответ из кэша или None, если его нет или срок истек.
+        """
+        key = self.make_key(url, start_date, end_date)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                body, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(body)
+                self._remove(key)
+
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and (row[1] is None or row[1] > now):
+                    with self.connection:
+                        self.connection.execute(
+                            "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                    self._put(key, row[0], row[1])
+                    self.shared_hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def set(self, url, start_date, end_date, data):
+        """
+        Сохранить ответ API в кэш.
+        """
+        key = self.make_key(url, start_date, end_date)
+        body = json.dumps(data, ensure_ascii=False)
+        expires_at = self._expires_at(end_date)
+        with self.lock:
+            self._put(key, body, expires_at)
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO responses (key, body, expires_at, size, accessed_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, body, expires_at, len(body), time.time())
+                    )
+                    self._evict_shared()
+
+    def _put(self, key, body, expires_at):
+        if len(body) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (body, expires_at)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        body, _ = self.entries.pop(key)
+        self.size -= len(body)
+
+    def _evict_shared(self):
+        # Удаляем просроченные записи и самые давно используемые сверх лимита
+        self.connection.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                (time.time(),))
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+    def stats(self):
+        """
+        Счетчики попаданий и промахов, размер кэша.
+        """
+        with self.lock:
+            requests_total = self.hits + self.shared_hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hit_ratio": (self.hits + self.shared_hits) / requests_total if requests_total else 0.0,
+            }
+
+
+# Отметка отсутствующей записи в LookupCache (отрицательный кэш)
+MISSING = object()
+
+
+class LookupCache:
+    """
+    Ограниченный LRU-кэш результатов поиска в базе со сроком жизни записей.
+    Отсутствие записи тоже кэшируется (значение MISSING) с отдельным, обычно более коротким сроком.
+    """
+    def __init__(self, max_entries=10000, ttl=300, negative_ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Значение, MISSING для закэшированного отсутствия или None, если записи нет или срок истек.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    if value is MISSING:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Удалить записи, значения которых удовлетворяют predicate (например, по ID пользователя).
+        """
+        with self.lock:
+            stale = [key for key, (value, _) in self.entries.items() if value is not MISSING and predicate(value)]
+            for key in stale:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+            }
@@ -0,0 +1,268 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib.figure import Figure
+
+from density import density_estimate, has_density
+from downsample import downsample, lttb_indices
+from metrics import timer
+
+# "static" - PNG, нарисованный matplotlib на сервере; "interactive" - прореженные данные для графика в браузере
+BACKEND = os.getenv("chart_backend", "static")
+CACHE_MAX_BYTES = int(os.getenv("chart_cache_mb", 32)) * 1024 * 1024
+DPI = 100
+# Ширина графика в браузере (пиксели) для интерактивного режима: больше точек на экране не различить
+INTERACTIVE_WIDTH = int(os.getenv("chart_width_px", 1200))
+# Маркеры рисуются только на коротких рядах
+MARKER_MAX_POINTS = 200
+# Сообщение вместо графика плотности для ряда из одной точки или из одинаковых значений
+NO_DENSITY_MESSAGE = "Плотность вероятности не строится: нужно хотя бы два различных значения."
+
+
+class ChartCache:
+    """
+    LRU-кэш отрисованных графиков (PNG) с ограничением по памяти.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            image = self.entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def set(self, key, image):
+        with self.lock:
+            if key in self.entries or len(image) > self.max_bytes:
+                return
+            self.entries[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, removed = self.entries.popitem(last=False)
+                self.size -= len(removed)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.size}
+
+
+chart_cache = ChartCache(CACHE_MAX_BYTES)
+
+
+def fingerprint(kind, arrays, params):
+    """
+    Отпечаток графика: тип, данные и параметры оформления.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(kind.encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode())
+        digest.update(array.tobytes())
+    digest.update(repr(sorted(params.items())).encode())
+    return digest.hexdigest()
+
+
+def render(kind, arrays, params, draw):
+    """
+    Получить PNG графика из кэша или нарисовать его функцией draw(figure, ax).
+    Используется объектный API matplotlib без глобального состояния pyplot,
+    поэтому фигура освобождается сразу после сохранения.
+    """
+    key = fingerprint(kind, arrays, params)
+    image = chart_cache.get(key)
+    if image is None:
+        with timer("chart_render", kind=kind):
+            figure = Figure(figsize=params["figsize"], dpi=DPI)
+            ax = figure.subplots()
+            draw(figure, ax)
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format="png")
+            image = buffer.getvalue()
+        chart_cache.set(key, image)
+    return image
+
+
+def line_png(dates, values, title, ylabel, label, color, figsize=(12, 6)):
+    """
+    PNG графика ряда по датам (данные уже прорежены вызывающей стороной).
+    """
+    def draw(figure, ax):
+        marker = 'o' if len(values) <= MARKER_MAX_POINTS else None
+        ax.plot(dates, values, marker=marker, linestyle='-', color=color, label=label)
+        ax.set_title(title, fontsize=16)
+        ax.set_xlabel("Дата", fontsize=14)
+        ax.set_ylabel(ylabel, fontsize=14)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m.%Y'))
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend(fontsize=12)
+        figure.tight_layout()
+
+    params = {"figsize": figsize, "title": title, "ylabel": ylabel, "label": label, "color": color}
+    return render("line", (dates, values), params, draw)
+
+
+def multi_line_png(frame, title, ylabel, figsize=(12, 6)):
+    """
+    PNG нескольких рядов (столбцы DataFrame с индексом дат) на одном графике.
+    """
+    def draw(figure, ax):
+        for column in frame.columns:
+            ax.plot(frame.index, frame[column], linestyle='-', label=column)
+        ax.set_title(title, fontsize=16)
+        ax.set_xlabel("Дата", fontsize=14)
+        ax.set_ylabel(ylabel, fontsize=14)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m.%Y'))
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend(fontsize=12)
+        figure.tight_layout()
+
+    params = {"figsize": figsize, "title": title, "ylabel": ylabel, "columns": tuple(frame.columns)}
+    arrays = (frame.index.values,) + tuple(frame[column].values for column in frame.columns)
+    return render("multi_line", arrays, params, draw)
+
+
+def histogram_png(values, title, xlabel="Значение", ylabel="Частота", figsize=(8, 4), color='c'):
+    """
+    PNG гистограммы значений (20 интервалов).
+    """
+    def draw(figure, ax):
+        ax.hist(values, bins=20, color=color, alpha=0.7, edgecolor='k', label='Гистограмма')
+        ax.set_title(title, fontsize=14)
+        ax.set_xlabel(xlabel, fontsize=12)
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend()
+
+    params = {"figsize": figsize, "title": title, "xlabel": xlabel, "ylabel": ylabel, "color": color}
+    return render("histogram", (values,), params, draw)
+
+
+def density_png(values, title, xlabel="Значение", ylabel="Плотность", figsize=(8, 4), color='r', fill=False,
+                method=None):
+    """
+    PNG графика плотности вероятности или None, если плотность оценить нельзя (см. has_density).
+    Оценка плотности выполняется только при промахе кэша.
+    """
+    if not has_density(values):
+        return None
+
+    def draw(figure, ax):
+        x, density = density_estimate(values, method=method)
+        ax.plot(x, density, color=color, label='Плотность вероятности')
+        if fill:
+            ax.fill_between(x, density, color=color, alpha=0.3)
+        ax.set_title(title, fontsize=14)
+        ax.set_xlabel(xlabel, fontsize=12)
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend()
+
+    params = {"figsize": figsize, "title": title, "xlabel": xlabel, "ylabel": ylabel, "color": color,
+              "fill": fill, "method": method}
+    return render("density", (values,), params, draw)
+
+
+def line_chart(dates, values, title, ylabel, label, color, backend=None, full_resolution=False,
+               method="lttb"):
+    """
+    График ряда по датам. Длинные ряды прореживаются (method: "lttb" или "minmax") до числа
+    точек, которое помещается в ширину графика в пикселях, если не запрошено полное разрешение.
+    """
+    figsize = (12, 6)
+    interactive = (backend or BACKEND) == "interactive"
+    if not full_resolution:
+        max_points = INTERACTIVE_WIDTH if interactive else figsize[0] * DPI
+        dates, values = downsample(dates, values, max_points, method)
+
+    if interactive:
+        st.markdown(f"##### {title}")
+        st.line_chart(pd.DataFrame({label: values}, index=pd.to_datetime(dates)), y_label=ylabel)
+        return
+
+    st.image(line_png(dates, values, title, ylabel, label, color, figsize), use_container_width=True)
+
+
+def multi_line_chart(frame, title, ylabel, backend=None, full_resolution=False):
+    """
+    Несколько рядов (столбцы DataFrame с индексом дат) на одном графике.
+    При прореживании берется объединение точек LTTB всех рядов, чтобы индекс остался общим.
+    """
+    figsize = (12, 6)
+    interactive = (backend or BACKEND) == "interactive"
+    if not full_resolution:
+        frame = thin_frame(frame, INTERACTIVE_WIDTH if interactive else figsize[0] * DPI)
+
+    if interactive:
+        st.markdown(f"##### {title}")
+        st.line_chart(frame, y_label=ylabel)
+        return
+
+    st.image(multi_line_png(frame, title, ylabel, figsize), use_container_width=True)
+
+
+def thin_frame(frame, max_points):
+    """
+    Прореживание таблицы рядов до max_points точек на график: объединение точек LTTB всех столбцов.
+    """
+    if len(frame) == 0:
+        return frame
+    dates = frame.index.values
+    per_column = max_points // max(len(frame.columns), 1)
+    index = np.unique(np.concatenate([lttb_indices(dates, frame[column].values, per_column)
+                                      for column in frame.columns]))
+    return frame.iloc[index]
+
+
+def histogram_chart(values, title, xlabel="Значение", ylabel="Частота", figsize=(8, 4), color='c',
+                    backend=None):
+    """
+    Гистограмма значений (20 интервалов).
+    """
+    if (backend or BACKEND) == "interactive":
+        counts, edges = np.histogram(values, bins=20)
+        st.markdown(f"##### {title}")
+        st.bar_chart(pd.DataFrame({ylabel: counts}, index=np.round((edges[:-1] + edges[1:]) / 2, 2)),
+                     x_label=xlabel)
+        return
+
+    st.image(histogram_png(values, title, xlabel, ylabel, figsize, color), use_container_width=True)
+
+
+def density_chart(values, title, xlabel="Значение", ylabel="Плотность", figsize=(8, 4), color='r',
+                  fill=False, method=None, backend=None):
+    """
+    График плотности вероятности; для ряда, по которому плотность не оценить, - сообщение.
+    """
+    if not has_density(values):
+        st.info(NO_DENSITY_MESSAGE)
+        return
+
+    if (backend or BACKEND) == "interactive":
+        x, density = density_estimate(values, method=method)
+        st.markdown(f"##### {title}")
+        st.area_chart(pd.DataFrame({ylabel: density}, index=x), x_label=xlabel)
+        return
+
+    st.image(density_png(values, title, xlabel, ylabel, figsize, color, fill, method), use_container_width=True)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from service import load_many_series
+
+
+def comparison_frame(names, start_date, end_date):
+    """
+    Загрузить несколько инструментов за один диапазон и выровнять их по общему индексу дат.
+    Пропуски (выходные, дни без публикации) заполняются последним известным значением.
+    Возвращает (таблица, окна дат, которые не удалось загрузить).
+    """
+    series, failed = load_many_series(names, start_date, end_date)
+    return aligned_frame(series), failed
+
+
+def aligned_frame(series):
+    """
+    Таблица уже загруженных рядов {название: ряд}, выровненных по общим датам.
+    """
+    frame = pd.concat(
+        {name: pd.Series(data["values"], index=pd.DatetimeIndex(data["dates"])) for name, data in series.items()},
+        axis=1,
+    )
+    return frame.sort_index().ffill().dropna()
+
+
+def normalized(frame, base=100.0):
+    """
+    Ряды, приведенные к base на первую общую дату, для наложения на одном графике.
+    """
+    return frame / frame.iloc[0] * base
+
+
+def ratios(frame, numerator, denominator):
+    """
+    Отношение одного инструмента к другому (например, цена золота в долларах).
+    """
+    return frame[numerator] / frame[denominator]
+
+
+def correlations(frame, returns=True):
+    """
+    Матрица корреляций дневных относительных изменений (returns=True) или уровней.
+    """
+    if returns:
+        changes = frame.pct_change().replace([np.inf, -np.inf], np.nan).dropna()
+        return changes.corr()
+    return frame.corr()
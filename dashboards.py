@@ -0,0 +1,134 @@
+"""
+Сохраненные дашборды пользователей: именованный запрос (инструменты, период, показатели) в таблице
+saved_queries и его готовый результат - статистика, ряды (CSV) и график (PNG) - в dashboard_snapshots.
+Снимки пересчитываются фоновой синхронизацией (sync.py) после появления новых данных, поэтому открытие
+дашборда - это чтение одной строки, без загрузки рядов, расчета статистики и отрисовки.
+"""
+from datetime import date, timedelta
+
+from aggregates import STANDARD_RANGES
+from metrics import timed
+from service import INSTRUMENTS, METAL_URLS, json_safe, load_many_series, series_statistics
+
+# Показатели, которые можно выбрать для дашборда (ключи series_statistics)
+STAT_CHOICES = {
+    "mean": "Среднее арифметическое",
+    "median": "Медиана",
+    "maximum": "Максимум",
+    "minimum": "Минимум",
+    "moving_average": "Скользящее среднее (30 дн.)",
+    "volatility": "Волатильность (30 дн.)",
+}
+DEFAULT_STATS = ("mean", "median")
+
+
+def query_dates(query, today=None):
+    """
+    Период запроса: фиксированные даты или последние range_days дней по сегодняшний день.
+    """
+    if query["range_days"]:
+        end_date = today or date.today()
+        return end_date - timedelta(days=query["range_days"] - 1), end_date
+    return query["start_date"], query["end_date"]
+
+
+def range_label(query):
+    """
+    Подпись периода запроса для списка дашбордов.
+    """
+    for days, label in STANDARD_RANGES.values():
+        if query["range_days"] == days:
+            return f"{label} (скользящий)"
+    if query["range_days"]:
+        return f"Последние {query['range_days']} дн."
+    return f"{query['start_date']} - {query['end_date']}"
+
+
+def chart_png(series):
+    """
+    PNG графика дашборда: один ряд - график значений, несколько - динамика, приведенная к 100 на первую дату.
+    """
+    from charts import DPI, line_png, multi_line_png, thin_frame
+    from compare import aligned_frame, normalized
+    from downsample import downsample
+
+    max_points = 12 * DPI
+    if len(series) == 1:
+        (name, data), = series.items()
+        dates, values = downsample(data["dates"], data["values"], max_points)
+        ylabel = "Цена (за грамм)" if name in METAL_URLS else "Курс (BYN)"
+        return line_png(dates, values, title=name, ylabel=ylabel, label=name, color='b')
+    frame = aligned_frame(series)
+    if frame.empty:
+        return None
+    return multi_line_png(thin_frame(normalized(frame), max_points),
+                          title="Динамика (первая дата = 100)", ylabel="Индекс")
+
+
+@timed("api_call", function="build_snapshot")
+def build_snapshot(query, today=None):
+    """
+    Готовый результат сохраненного запроса для save_snapshot.
+    """
+    from export import csv_bytes
+
+    start_date, end_date = query_dates(query, today)
+    names = [name for name in query["instruments"] if name in INSTRUMENTS]
+    series, failed = load_many_series(names, start_date, end_date)
+    series = {name: data for name, data in series.items() if data["values"].size}
+    statistics = {}
+    for name, data in series.items():
+        values = series_statistics(data["values"])
+        statistics[name] = {key: json_safe(values[key]) for key in query["statistics"] if key in values}
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "statistics": statistics,
+        "failed_windows": len(failed),
+        "chart": chart_png(series) if series else None,
+        "series": csv_bytes(series),
+    }
+
+
+def snapshot(db, query):
+    """
+    Снимок запроса из базы; если его еще нет или скользящий период сдвинулся, он считается и сохраняется.
+    """
+    result = db.get_snapshot(query["id"])
+    if result is not None and (result["start_date"], result["end_date"]) == query_dates(query):
+        return result
+    result = build_snapshot(query)
+    db.save_snapshot(query["id"], result)
+    return result
+
+
+def needs_refresh(query, changed, today):
+    """
+    Снимок устарел: его нет, у инструментов запроса изменились данные не позже конца его периода
+    или скользящий период сдвинулся. changed - {инструмент: первая изменившаяся дата}, None - изменилось все.
+    """
+    if query["snapshot_at"] is None or changed is None:
+        return True
+    _, end_date = query_dates(query, today)
+    if any(name in changed and changed[name] <= end_date for name in query["instruments"]):
+        return True
+    return bool(query["range_days"]) and query["snapshot_at"].date() < today
+
+
+@timed("api_call", function="refresh_snapshots")
+def refresh_snapshots(db, changed=None):
+    """
+    Пересчитать устаревшие снимки всех сохраненных запросов после синхронизации.
+    changed - {инструмент: первая дата с новыми или изменившимися значениями}. Возвращает число пересчитанных снимков.
+    """
+    today = date.today()
+    refreshed = 0
+    for query in db.get_saved_queries():
+        if not needs_refresh(query, changed, today):
+            continue
+        try:
+            if db.save_snapshot(query["id"], build_snapshot(query, today)):
+                refreshed += 1
+        except Exception as e:
+            print(f"Дашборд {query['name']} (ID {query['id']}): ошибка пересчета: {e}")
+    return refreshed
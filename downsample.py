@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[D]").astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Индексы точек, выбранных алгоритмом Largest-Triangle-Three-Buckets.
+    Первая и последняя точки сохраняются всегда.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Границы корзин для внутренних точек
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else n
+        # Вершина треугольника в следующей корзине - ее среднее
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(y, buckets):
+    """
+    Индексы минимума и максимума в каждой из buckets равных корзин (до 2·buckets точек).
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if 2 * buckets >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    size = edges[1:] - edges[:-1]
+    # Корзины различаются по длине не больше чем на 1, поэтому дополняем до общей длины краевым значением
+    width = size.max()
+    index = np.minimum(edges[:-1, None] + np.arange(width), edges[1:, None] - 1)
+    values = y[index]
+    minimum = index[np.arange(buckets), values.argmin(axis=1)]
+    maximum = index[np.arange(buckets), values.argmax(axis=1)]
+    return np.unique(np.concatenate([minimum, maximum]))
+
+
+def downsample(x, y, max_points, method="lttb"):
+    """
+    Прореживание ряда до max_points точек для графика.
+    method: "lttb" (форма ряда, глобальные минимум и максимум сохраняются) или "minmax" (экстремумы каждой корзины).
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if max_points is None or len(y) <= max_points:
+        return x, y
+    if method == "minmax":
+        index = minmax_indices(y, max_points // 2)
+    else:
+        index = lttb_indices(x, y, max_points)
+        index = np.unique(np.concatenate([index, [np.argmin(y), np.argmax(y)]]))
+    return x[index], y[index]
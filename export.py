@@ -0,0 +1,137 @@
+import csv
+import io
+import re
+
+import numpy as np
+import xlsxwriter
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIME = "text/csv"
+PARQUET_MIME = "application/vnd.apache.parquet"
+
+# Подписи сводной статистики в отчетах
+STAT_LABELS = {
+    'mean': 'Среднее арифметическое',
+    'median': 'Медиана',
+    'maximum': 'Максимум',
+    'minimum': 'Минимум',
+}
+
+# Нулевой день в нумерации дат Excel
+EXCEL_EPOCH = np.datetime64("1899-12-30", "D")
+
+
+def sheet_name(name):
+    """
+    Имя листа Excel: без запрещенных символов и не длиннее 31 символа.
+    """
+    return re.sub(r"[\[\]:*?/\\]", "_", name)[:31]
+
+
+def excel_serials(dates):
+    """
+    Даты datetime64 в виде порядковых номеров дней Excel (вычисляется сразу для всего столбца).
+    """
+    return (np.asarray(dates, dtype="datetime64[D]") - EXCEL_EPOCH).astype(np.int64).tolist()
+
+
+def excel_bytes(instruments, statistics=None, value_label="Значение", stats_sheet="Статистика", charts=False):
+    """
+    Excel-книга с листом данных для каждого инструмента и общим листом статистики.
+    instruments: {название листа: ряд {"dates", "values"}}, statistics: {название: {подпись: значение}}.
+    Книга пишется построчно в режиме constant_memory: в памяти держится только текущая строка,
+    промежуточные данные xlsxwriter хранит в собственных временных файлах с уникальными именами.
+    """
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    date_format = workbook.add_format({"num_format": "dd.mm.yyyy"})
+
+    for name, series in instruments.items():
+        worksheet = workbook.add_worksheet(sheet_name(name))
+        worksheet.set_column(0, 0, 12)
+        worksheet.write_row(0, 0, ["Дата", value_label])
+        serials = excel_serials(series["dates"])
+        values = np.asarray(series["values"], dtype=np.float64).tolist()
+        for row, (serial, value) in enumerate(zip(serials, values), start=1):
+            worksheet.write_number(row, 0, serial, date_format)
+            worksheet.write_number(row, 1, value)
+
+        if charts and values:
+            chart = workbook.add_chart({'type': 'line'})
+            reference = f"'{sheet_name(name)}'"
+            chart.add_series({
+                'name': value_label,
+                'categories': f'={reference}!$A$2:$A${len(values) + 1}',
+                'values': f'={reference}!$B$2:$B${len(values) + 1}'
+            })
+            chart.set_title({'name': f'График: {name}'})
+            chart.set_x_axis({'name': 'Дата', 'date_axis': True, 'num_format': 'dd.mm.yyyy'})
+            chart.set_y_axis({'name': f'{value_label} (BYN)'})
+            worksheet.insert_chart('D2', chart)
+
+    if statistics:
+        worksheet = workbook.add_worksheet(sheet_name(stats_sheet))
+        names = list(statistics)
+        labels = list(dict.fromkeys(label for values in statistics.values() for label in values))
+        worksheet.set_column(0, 0, 26)
+        worksheet.write_row(0, 0, ["Статистика"] + (names if len(names) > 1 else ["Значение"]))
+        for row, label in enumerate(labels, start=1):
+            worksheet.write_string(row, 0, label)
+            for column, name in enumerate(names, start=1):
+                value = statistics[name].get(label)
+                if value is not None:
+                    worksheet.write_number(row, column, float(value))
+
+    workbook.close()
+    return output.getvalue()
+
+
+def iter_csv(instruments, chunk_size=10000):
+    """
+    Построчная выгрузка в CSV (instrument, date, value) кусками, без сборки таблицы в памяти.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["instrument", "date", "value"])
+    for name, series in instruments.items():
+        dates = np.asarray(series["dates"], dtype="datetime64[D]").astype(str).tolist()
+        values = np.asarray(series["values"], dtype=np.float64).tolist()
+        for start in range(0, len(dates), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            writer.writerows((name, day, value) for day, value in zip(dates[chunk], values[chunk]))
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def csv_bytes(instruments):
+    """
+    CSV со всеми инструментами в длинном формате.
+    """
+    return b"".join(iter_csv(instruments))
+
+
+def parquet_bytes(instruments):
+    """
+    Parquet со всеми инструментами (столбцы instrument, date, value) для массовой выгрузки.
+    Столбцы передаются в pyarrow напрямую из массивов, без промежуточного DataFrame.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    names = list(instruments)
+    lengths = [len(instruments[name]["values"]) for name in names]
+    dates = [np.asarray(instruments[name]["dates"], dtype="datetime64[D]") for name in names]
+    values = [np.asarray(instruments[name]["values"], dtype=np.float64) for name in names]
+    table = pa.table({
+        "instrument": pa.DictionaryArray.from_arrays(
+            np.repeat(np.arange(len(names), dtype=np.int32), lengths), pa.array(names, pa.string())
+        ),
+        "date": pa.array(np.concatenate(dates or [np.array([], dtype="datetime64[D]")])),
+        "value": pa.array(np.concatenate(values or [np.array([], dtype=np.float64)])),
+    })
+    output = io.BytesIO()
+    pq.write_table(table, output)
+    return output.getvalue()
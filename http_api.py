@@ -0,0 +1,293 @@
+"""
+HTTP/JSON API аналитического сервиса (service.py) для внутренних дашбордов и пакетных заданий, без Streamlit.
+Приложение WSGI: в продакшене запускается несколькими процессами с потоками, например
+    gunicorn -w 4 --threads 4 -b 0.0.0.0:8000 http_api:application
+процессы делят локальное хранилище SQLite (и кэш ответов, если задан cache_path), поэтому сервис
+масштабируется горизонтально. Для разработки: python http_api.py --port 8000.
+
+Каждый ответ содержит ETag; запрос с If-None-Match и тем же тегом получает 304 без тела.
+Все эндпоинты - GET, инструмент задается названием ("Золото") или кодом ("gold", "USD"):
+    /instruments
+    /series?instrument=gold&start=2024-01-01&end=2024-12-31[&points=1000]
+    /statistics?instrument=gold&start=...&end=...
+    /ranges?instrument=gold
+    /ohlc?instrument=gold&period=week|month&start=...&end=...
+    /rolling?instrument=gold&window=7|30|90&start=...&end=...
+    /quote?instrument=USD[&lookback=30]  (lookback - от 1 до 365 дней)
+    /export?instrument=gold&start=...&end=...&format=xlsx|csv|parquet
+    /healthz
+"""
+import argparse
+import hashlib
+import json
+from datetime import date, timedelta
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, quote
+from wsgiref.simple_server import WSGIServer, make_server
+
+import numpy as np
+
+import service
+from aggregates import ROLLING_WINDOWS
+from metrics import registry, timer
+
+# Латинские коды инструментов для URL
+CODES = {
+    "gold": "Золото",
+    "silver": "Серебро",
+    "platinum": "Платина",
+    "palladium": "Палладий",
+    "USD": "Доллары (USD)",
+    "EUR": "Евро (EUR)",
+    "RUB": "Российские рубли (RUB)",
+}
+NAMES = {name: code for code, name in CODES.items()}
+# Период по умолчанию, если start не задан
+DEFAULT_DAYS = 365
+# Наибольшая глубина поиска последней котировки (/quote): один запрос к НБРБ не длиннее года
+MAX_LOOKBACK_DAYS = 365
+
+STATUS = {
+    200: "200 OK",
+    304: "304 Not Modified",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    405: "405 Method Not Allowed",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def instrument(query):
+    name = query.get("instrument", [""])[0]
+    name = CODES.get(name, name)
+    if name not in service.INSTRUMENTS:
+        raise HTTPError(404, f"Неизвестный инструмент: {name}")
+    return name
+
+
+def date_range(query):
+    try:
+        end_date = date.fromisoformat(query["end"][0]) if "end" in query else date.today()
+        start_date = (date.fromisoformat(query["start"][0]) if "start" in query
+                      else end_date - timedelta(days=DEFAULT_DAYS - 1))
+    except ValueError:
+        raise HTTPError(400, "Даты задаются в формате YYYY-MM-DD")
+    if start_date > end_date:
+        raise HTTPError(400, "Начальная дата позже конечной")
+    return start_date, end_date
+
+
+def failed_windows(failed):
+    return [[start.isoformat(), end.isoformat()] for start, end in failed]
+
+
+def instruments_view(query):
+    return [
+        {"name": name, "code": NAMES[name], "kind": "metal" if name in service.METAL_URLS else "currency"}
+        for name in service.INSTRUMENTS
+    ]
+
+
+def series_view(query):
+    name = instrument(query)
+    start_date, end_date = date_range(query)
+    url, value_key = service.INSTRUMENTS[name]
+    series, failed = service.load_series(url, start_date, end_date, value_key)
+    dates, values = series["dates"], series["values"]
+    if "points" in query:
+        from downsample import downsample
+        try:
+            dates, values = downsample(dates, values, max(3, int(query["points"][0])))
+        except ValueError:
+            raise HTTPError(400, "points - целое число")
+    return {
+        "instrument": name,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "dates": np.datetime_as_string(dates).tolist(),
+        "values": values.tolist(),
+        "failed": failed_windows(failed),
+    }
+
+
+def statistics_view(query):
+    name = instrument(query)
+    start_date, end_date = date_range(query)
+    result = service.analyze(name, start_date, end_date)
+    statistics = result["statistics"] or {}
+    return {
+        "instrument": name,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "count": int(result["series"]["values"].size),
+        "statistics": {key: service.json_safe(value) for key, value in statistics.items()} or None,
+        "failed": failed_windows(result["failed"]),
+    }
+
+
+def ranges_view(query):
+    name = instrument(query)
+    return {
+        "instrument": name,
+        "ranges": {
+            range_name: {**row, "start": row["start"].isoformat(), "end": row["end"].isoformat()}
+            for range_name, row in service.range_statistics(name).items()
+        },
+    }
+
+
+def ohlc_view(query):
+    name = instrument(query)
+    start_date, end_date = date_range(query)
+    period = query.get("period", ["week"])[0]
+    if period not in ("week", "month"):
+        raise HTTPError(400, "period - week или month")
+    rows = service.ohlc(name, period, start_date, end_date)
+    return {
+        "instrument": name,
+        "period": period,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "rows": [
+            {"start": start, "open": open_, "high": high, "low": low, "close": close, "mean": mean, "count": count}
+            for start, open_, high, low, close, mean, count in rows
+        ],
+    }
+
+
+def rolling_view(query):
+    name = instrument(query)
+    start_date, end_date = date_range(query)
+    try:
+        window = int(query.get("window", ["30"])[0])
+    except ValueError:
+        window = None
+    if window not in ROLLING_WINDOWS:
+        raise HTTPError(400, f"window - одно из {', '.join(map(str, ROLLING_WINDOWS))}")
+    dates, values = service.rolling_means(name, window, start_date, end_date)
+    return {
+        "instrument": name,
+        "window": window,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "dates": dates,
+        "values": values,
+    }
+
+
+def quote_view(query):
+    name = instrument(query)
+    try:
+        lookback = int(query.get("lookback", ["30"])[0])
+    except ValueError:
+        raise HTTPError(400, "lookback - целое число")
+    if not 1 <= lookback <= MAX_LOOKBACK_DAYS:
+        raise HTTPError(400, f"lookback - от 1 до {MAX_LOOKBACK_DAYS} дней")
+    quote_date, value = service.get_latest_quote(*service.INSTRUMENTS[name], lookback_days=lookback)
+    return {"instrument": name, "date": quote_date.isoformat() if quote_date else None, "value": value}
+
+
+def export_view(query):
+    name = instrument(query)
+    start_date, end_date = date_range(query)
+    fmt = query.get("format", ["csv"])[0]
+    formats = service.export_formats()
+    if fmt not in formats:
+        raise HTTPError(400, f"Формат выгрузки: {', '.join(formats)}")
+    url, value_key = service.INSTRUMENTS[name]
+    series, _ = service.load_series(url, start_date, end_date, value_key)
+    if not series["values"].size:
+        raise HTTPError(404, "Нет данных за выбранный период")
+    # Файлы некоторых форматов (xlsx) содержат время создания, поэтому ETag строится по входным данным:
+    # инструменту, периоду, формату и самому ряду. Файл собирается, только если тег не совпал
+    digest = hashlib.blake2b(f"{name}|{start_date}|{end_date}|{fmt}".encode("utf-8"), digest_size=16)
+    digest.update(np.asarray(series["dates"], dtype="datetime64[D]").tobytes())
+    digest.update(np.asarray(series["values"], dtype=np.float64).tobytes())
+    file_name = quote(f"{NAMES[name]}_{start_date}_{end_date}.{fmt}")
+    return (
+        lambda: service.export_file(name, series, service.series_statistics(series["values"]), fmt),
+        formats[fmt],
+        [("Content-Disposition", f"attachment; filename*=UTF-8''{file_name}")],
+        '"' + digest.hexdigest() + '"',
+    )
+
+
+ROUTES = {
+    "/instruments": instruments_view,
+    "/series": series_view,
+    "/statistics": statistics_view,
+    "/ranges": ranges_view,
+    "/ohlc": ohlc_view,
+    "/rolling": rolling_view,
+    "/quote": quote_view,
+    "/export": export_view,
+    "/healthz": lambda query: {"status": "ok"},
+}
+
+
+def respond(environ, start_response, status, body, content_type, headers=(), etag=None):
+    """
+    Ответ с ETag по содержимому; совпадение с If-None-Match - 304 без тела.
+    Если etag задан заранее, body может быть функцией: тело строится, только когда нужен ответ 200.
+    """
+    if etag is None:
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = [("ETag", etag), ("Cache-Control", "no-cache"), *headers]
+    if status == 200:
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            start_response(STATUS[304], headers)
+            return []
+    if callable(body):
+        body = body()
+    start_response(STATUS[status], [("Content-Type", content_type), ("Content-Length", str(len(body))), *headers])
+    return [body]
+
+
+def application(environ, start_response):
+    """
+    WSGI-приложение.
+    """
+    path = environ.get("PATH_INFO", "/").rstrip("/") or "/"
+    view = ROUTES.get(path)
+    label = path if view else "unknown"
+    registry.inc("http_requests", path=label)
+    with timer("http_request", path=label):
+        try:
+            if view is None:
+                raise HTTPError(404, "Неизвестный ресурс")
+            if environ.get("REQUEST_METHOD") != "GET":
+                raise HTTPError(405, "Поддерживается только GET")
+            result = view(parse_qs(environ.get("QUERY_STRING", "")))
+        except HTTPError as e:
+            body = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+            return respond(environ, start_response, e.status, body, "application/json; charset=utf-8")
+
+        if isinstance(result, tuple):
+            body, content_type, headers, *etag = result
+            return respond(environ, start_response, 200, body, content_type, headers, *etag)
+        body = json.dumps(result, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        return respond(environ, start_response, 200, body, "application/json; charset=utf-8")
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API аналитики НБРБ")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    with make_server(args.host, args.port, application, server_class=ThreadingWSGIServer) as server:
+        print(f"HTTP API: http://{args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,79 @@
 import os
-from datetime import date
+import time
+from datetime import date, timedelta
 import streamlit as st
 from dotenv import load_dotenv, find_dotenv
-from DB import MySQL
-from API import (
-    get_metal_price,
-    get_currency_data,
-    display_closest_price,
-    plot_histogram,
-    plot_density,
-    calculate_statistics,
-    create_excel_file
-)
-import pandas as pd
-import io
+from DB import MySQL, SESSION_TTL
+from metrics import registry, start_metrics_server, start_metrics_dump
+
+# Модули аналитики (API, compare, charts, export) тянут numpy, pandas, matplotlib и scipy.
+# Они импортируются в ветках страниц анализа, поэтому форма входа не ждет загрузки всего стека,
+# а при последующих перезапусках скрипта импорт - это просто поиск в sys.modules.
 
 # Загрузка переменных окружения
 load_dotenv(find_dotenv())
 
-# Подключение к базе данных
-bd = MySQL(
-    host=os.getenv("host"),
-    port=3306,
-    user=os.getenv("user"),
-    password=os.getenv("password"),
-    db_name=os.getenv("database"),
-)
+# Подключение к базе данных: один объект на процесс, чтобы пул соединений, пул bcrypt,
+# кэш поиска пользователей и счетчики попыток входа переживали перезапуски скрипта.
+# Там же один раз на процесс применяются миграции схемы (отключается db_migrate_on_start=0)
+@st.cache_resource
+def get_database():
+    database = MySQL(
+        host=os.getenv("host"),
+        port=3306,
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        db_name=os.getenv("database"),
+    )
+    if os.getenv("db_migrate_on_start", "1") == "1":
+        database.migrate()
+    return database
+
+
+# Число доверенных обратных прокси перед приложением. 0 - приложение доступно напрямую,
+# и заголовки с адресом клиента не учитываются: их может подставить сам клиент
+TRUSTED_PROXY_HOPS = int(os.getenv("trusted_proxy_hops", 0))
+
+
+# IP-адрес клиента для ограничения попыток входа. Streamlit сам адрес не передает, он берется
+# из заголовков доверенного обратного прокси; без прокси ограничение по IP не применяется (None).
+# Каждый прокси дописывает в конец X-Forwarded-For адрес, от которого получил запрос, поэтому левые записи
+# задает клиент, а адрес, увиденный первым доверенным прокси, стоит на месте trusted_proxy_hops с конца
+def client_ip():
+    if TRUSTED_PROXY_HOPS <= 0:
+        return None
+    headers = st.context.headers
+    forwarded = [address.strip() for address in headers.get("X-Forwarded-For", "").split(",") if address.strip()]
+    if len(forwarded) >= TRUSTED_PROXY_HOPS:
+        return forwarded[-TRUSTED_PROXY_HOPS]
+    # X-Real-Ip выставляет сам прокси (nginx: proxy_set_header X-Real-IP $remote_addr)
+    return headers.get("X-Real-Ip")
+
+
+bd = get_database()
+
+# Cookie с токеном сессии входа
+SESSION_COOKIE = "bank_rate_session"
+# Параметр адреса, в котором токен передавался раньше
+SESSION_PARAM = "session"
+
+
+# Запись cookie сессии в браузере (token=None - удаление). Из Python Streamlit cookie не задает, поэтому она
+# выставляется скриптом во встроенном фрейме того же источника (allow-same-origin) и относится к адресу
+# приложения; сервер читает ее через st.context.cookies при подключении страницы. В отличие от параметра
+# адреса, токен не попадает в историю браузера, журналы прокси и скопированные ссылки
+def store_session_cookie(token):
+    from streamlit.components.v1 import html
+    value, max_age = (token, int(SESSION_TTL.total_seconds())) if token else ("", 0)
+    html(f"""<script>
+    const secure = window.parent.location.protocol === "https:" ? "; Secure" : "";
+    window.parent.document.cookie = "{SESSION_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Strict" + secure;
+    </script>""", height=0)
+
+# Эндпоинт /metrics и периодическая выгрузка метрик (запускаются один раз на процесс, если настроены)
+start_metrics_server()
+start_metrics_dump()
+page_started = time.perf_counter()
 
 # Инициализация состояний
 if 'form_state' not in st.session_state:
@@ -37,6 +85,21 @@ if 'metal_choice' not in st.session_state:
 if 'menu_choice' not in st.session_state:
     st.session_state.menu_choice = 'Металл'
 
+# Токен, оставшийся в адресе от прежних версий, отзывается и убирается из адреса
+if SESSION_PARAM in st.query_params:
+    bd.delete_session(st.query_params[SESSION_PARAM])
+    del st.query_params[SESSION_PARAM]
+
+# После перезагрузки страницы вход восстанавливается по cookie сессии без повторной проверки пароля.
+# Токен при этом заменяется новым: старый, если он где-то сохранился, больше не действует
+if st.session_state.form_state == 'login' and st.context.cookies.get(SESSION_COOKIE):
+    user_id, token = bd.rotate_session(st.context.cookies[SESSION_COOKIE])
+    if user_id:
+        st.session_state.user_id = user_id
+        st.session_state.session_token = token
+        st.session_state.form_state = 'analytics'
+        store_session_cookie(token)
+
 # Боковое меню с кнопками
 if st.session_state.form_state != 'login':
     with st.sidebar:
@@ -48,6 +111,10 @@ if st.session_state.form_state != 'login':
             st.session_state.menu_choice = "Валюта"
             st.session_state.form_state = 'currency_analytics'
 
+        if st.button("Сравнение", use_container_width=True):
+            st.session_state.menu_choice = "Сравнение"
+            st.session_state.form_state = 'comparison'
+
         if st.button("Личный кабинет", use_container_width=True):
             st.session_state.menu_choice = "Личный кабинет"
             st.session_state.form_state = 'profile'
@@ -57,8 +124,14 @@ if st.session_state.form_state != 'login':
             st.session_state.form_state = 'login'
             st.session_state.metal_choice = None
             st.session_state.menu_choice = 'Металл'
+            # Результаты анализа не переживают выход из аккаунта
+            for key in ("results", "metal_shown", "currency_shown", "dashboard_shown", "user_id"):
+                st.session_state.pop(key, None)
+            bd.delete_session(st.session_state.pop("session_token", None))
+            store_session_cookie(None)
 
 # Обработка форм
+page = st.session_state.form_state
 if st.session_state.form_state == 'login':
     with st.form("login"):
         st.markdown("#### Введите свои данные для входа")
@@ -68,8 +141,17 @@ if st.session_state.form_state == 'login':
         register = st.form_submit_button("Регистрация")
 
     if submit:
-        if bd.verify_password(email, password):
+        ip = client_ip()
+        retry_after = bd.login_retry_after(email, ip)
+        if retry_after:
+            st.error(f"Слишком много неудачных попыток входа. Повторите через {retry_after:.0f} с.")
+        elif user_id := bd.authenticate(email, password, ip=ip):
+            st.session_state.user_id = user_id
             st.session_state.form_state = 'analytics'
+            token = bd.create_session(user_id)
+            if token:
+                st.session_state.session_token = token
+                store_session_cookie(token)
             st.success("Вход выполнен успешно")
         else:
             st.error("Ошибка входа. Неверный email или пароль.")
@@ -100,86 +182,171 @@ elif st.session_state.form_state == 'registration':
 
 elif st.session_state.form_state == 'profile':
     st.markdown("### Личный кабинет")
-    st.write("Здесь будет информация о вашем профиле и настройки.")
+    user_id = st.session_state.get("user_id")
+    if not user_id:
+        st.info("Войдите в аккаунт заново, чтобы работать с сохраненными дашбордами.")
+    else:
+        from API import INSTRUMENTS, display_dashboard
+        from aggregates import STANDARD_RANGES
+        from dashboards import STAT_CHOICES, DEFAULT_STATS, snapshot
+
+        user = bd.get_user_info(user_id)
+        if user:
+            st.write(f"Email: {user['email']}")
+
+        # Дашборд открывается из готового снимка, который фоновая синхронизация обновляет после публикации НБРБ
+        st.markdown("#### Сохраненные дашборды")
+        queries = {query["id"]: query for query in bd.get_saved_queries(user_id)}
+        if queries:
+            query_id = st.selectbox("Дашборд:", list(queries), format_func=lambda key: queries[key]["name"])
+            open_column, delete_column = st.columns(2)
+            if open_column.button("Открыть", use_container_width=True):
+                st.session_state.dashboard_shown = query_id
+            if delete_column.button("Удалить", use_container_width=True):
+                bd.delete_saved_query(query_id, user_id)
+                st.session_state.pop("dashboard_shown", None)
+                st.rerun()
+
+            shown = queries.get(st.session_state.get("dashboard_shown"))
+            if shown:
+                display_dashboard(shown, snapshot(bd, shown))
+        else:
+            st.write("Сохраненных дашбордов пока нет.")
+
+        st.markdown("#### Новый дашборд")
+        ranges = {label: days for days, label in STANDARD_RANGES.values()}
+        with st.form("dashboard"):
+            name = st.text_input("Название")
+            names = st.multiselect("Инструменты:", list(INSTRUMENTS))
+            period = st.selectbox("Период:", [*ranges, "Свои даты"], index=len(ranges) - 2)
+            start_date = st.date_input("Начальная дата (для своих дат):", date.today() - timedelta(days=365))
+            end_date = st.date_input("Конечная дата (для своих дат):", date.today())
+            statistics = st.multiselect("Показатели:", list(STAT_CHOICES), default=list(DEFAULT_STATS),
+                                        format_func=STAT_CHOICES.get)
+            save = st.form_submit_button("Сохранить")
+
+        if save:
+            range_days = ranges.get(period)
+            if not name.strip() or not names:
+                st.error("Укажите название и хотя бы один инструмент.")
+            elif range_days is None and start_date > end_date:
+                st.error("Начальная дата позже конечной.")
+            else:
+                query = {
+                    "name": name.strip(),
+                    "instruments": names,
+                    "statistics": statistics,
+                    "range_days": range_days,
+                    "start_date": None if range_days else start_date,
+                    "end_date": None if range_days else end_date,
+                }
+                query["id"] = bd.save_query(user_id, query["name"], names, statistics, start_date=query["start_date"],
+                                            end_date=query["end_date"], range_days=range_days)
+                if query["id"]:
+                    # Снимок считается сразу, чтобы и первое открытие было готовым
+                    snapshot(bd, query)
+                    st.session_state.dashboard_shown = query["id"]
+                    st.rerun()
+                else:
+                    st.error("Не удалось сохранить дашборд.")
 
 elif st.session_state.form_state == 'metal_analytics':
     st.markdown("### Анализ цен на драгоценные металлы")
+    from API import display_closest_price, display_range_statistics, build_result, display_result
+    from results import memoized, session_results
 
     metal_choice = st.radio("Выберите металл:", ("Золото", "Серебро", "Платина", "Палладий"))
     display_closest_price(metal_choice=metal_choice)
+    display_range_statistics(metal_choice=metal_choice)
 
     start_date = st.date_input("Выберите начальную дату:", date.today())
     end_date = st.date_input("Выберите конечную дату:", date.today())
-
-    if st.button("Показать данные"):
-        st.markdown(f"#### Данные для {metal_choice} с {start_date} по {end_date}")
-        data = get_metal_price(metal_choice, start_date, end_date)
-
-        if data:
-            st.markdown("### Гистограмма цен")
-            plot_histogram(data, label=f"Цена {metal_choice}")
-
-            st.markdown("### Плотность вероятности")
-            plot_density(data, label=f"Цена {metal_choice}")
-
-            mean, median = calculate_statistics(data)
-            st.metric(label="Среднее арифметическое", value=f"{mean:.2f}")
-            st.metric(label="Медиана", value=f"{median:.2f}")
-
-            # Создание Excel файла
-            excel_data = create_excel_file(data, mean, median, metal_choice=metal_choice)
-
-            # Кнопка для скачивания Excel файла
-            st.download_button(
-                label="Скачать Excel файл",
-                data=excel_data,
-                file_name=f"{metal_choice}_данные_с_{start_date}_по_{end_date}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+    full_resolution = st.checkbox("Показать все точки графика")
+
+    # Показывается последний запрошенный результат; выбор, уже посчитанный в этой сессии, - сразу, без кнопки
+    request = (metal_choice, start_date, end_date)
+    if st.button("Показать данные") or request in session_results():
+        st.session_state.metal_shown = request
+
+    shown = st.session_state.get("metal_shown")
+    if shown:
+        name, shown_start, shown_end = shown
+        st.markdown(f"#### Данные для {name} с {shown_start} по {shown_end}")
+        result = memoized(shown, lambda: build_result(name, shown_start, shown_end))
+        if result:
+            display_result(name, result, shown_start, shown_end, full_resolution)
+        else:
+            st.error(f"Данные о {name} отсутствуют.")
+            st.session_state.metal_shown = None
 
 elif st.session_state.form_state == 'currency_analytics':
     st.markdown("### Анализ курсов валют")
+    from API import display_closest_price, display_range_statistics, build_result, display_result
+    from results import memoized, session_results
 
     currency_group = st.radio("Выберите категорию валюты:",
                               ("Доллары (USD)", "Евро (EUR)", "Российские рубли (RUB)"), index=0)
 
     display_closest_price(currency_group=currency_group)
+    display_range_statistics(currency_group=currency_group)
 
-    api_urls = {
-        "Доллары (USD)": "https://api.nbrb.by/exrates/rates/dynamics/431",
-        "Евро (EUR)": "https://api.nbrb.by/exrates/rates/dynamics/451",
-        "Российские рубли (RUB)": "https://api.nbrb.by/exrates/rates/dynamics/456",
-    }
-
-    selected_url = api_urls[currency_group]
     start_date = st.date_input("Начальная дата:", date.today())
     end_date = st.date_input("Конечная дата:", date.today())
+    full_resolution = st.checkbox("Показать все точки графика")
+
+    request = (currency_group, start_date, end_date)
+    if st.button("Показать данные") or request in session_results():
+        st.session_state.currency_shown = request
+
+    shown = st.session_state.get("currency_shown")
+    if shown:
+        name, shown_start, shown_end = shown
+        st.markdown(f"#### Данные для {name} с {shown_start} по {shown_end}")
+        result = memoized(shown, lambda: build_result(name, shown_start, shown_end))
+        if result:
+            display_result(name, result, shown_start, shown_end, full_resolution)
+        else:
+            st.error("Данные отсутствуют для выбранного периода.")
+            st.session_state.currency_shown = None
+
+elif st.session_state.form_state == 'comparison':
+    st.markdown("### Сравнение инструментов")
+    from API import INSTRUMENTS, report_failed_windows
+    from compare import comparison_frame, normalized, ratios, correlations
+    from charts import multi_line_chart
+    from export import csv_bytes, CSV_MIME
+
+    names = st.multiselect("Выберите инструменты:", list(INSTRUMENTS), default=["Золото", "Доллары (USD)"])
+    start_date = st.date_input("Начальная дата:", date.today() - timedelta(days=365))
+    end_date = st.date_input("Конечная дата:", date.today())
 
-    if st.button("Показать данные"):
-        st.markdown(f"#### Данные для {currency_group} с {start_date} по {end_date}")
-        data = get_currency_data(selected_url, start_date, end_date)
-
-        if data:
-            st.markdown("### Гистограмма курсов")
-            plot_histogram(data, label=f"Курс {currency_group}")
+    if st.button("Сравнить") and names:
+        # Все инструменты загружаются одним пакетом и выравниваются по общим датам
+        frame, failed = comparison_frame(names, start_date, end_date)
+        report_failed_windows(failed)
+        if failed:
+            st.warning("Пропуски в данных инструментов с ошибкой заполнены последним известным значением.")
 
-            st.markdown("### Плотность вероятности")
-            plot_density(data, label=f"Курс {currency_group}")
+        if frame.empty:
+            st.error("Нет общих данных для выбранных инструментов за этот период.")
+        else:
+            multi_line_chart(normalized(frame), title="Динамика (первая дата = 100)", ylabel="Индекс")
 
-            mean, median = calculate_statistics(data)
-            st.metric(label="Среднее арифметическое", value=f"{mean:.2f}")
-            st.metric(label="Медиана", value=f"{median:.2f}")
+            if len(names) > 1:
+                st.markdown("#### Корреляция дневных изменений")
+                st.dataframe(correlations(frame).round(2))
 
-            # Создание Excel файла
-            excel_data = create_excel_file(data, mean, median, currency_group=currency_group)
+                st.markdown(f"#### Отношение {names[0]} / {names[1]}")
+                ratio = ratios(frame, names[0], names[1])
+                multi_line_chart(ratio.to_frame(f"{names[0]} / {names[1]}"),
+                                 title=f"Отношение {names[0]} / {names[1]}", ylabel="Отношение")
 
-            # Кнопка для скачивания Excel файла
             st.download_button(
-                label="Скачать Excel файл",
-                data=excel_data,
-                file_name=f"{currency_group}_данные_с_{start_date}_по_{end_date}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                label="Скачать CSV",
+                data=csv_bytes({name: {"dates": frame.index.values, "values": frame[name].values} for name in names}),
+                file_name=f"сравнение_с_{start_date}_по_{end_date}.csv",
+                mime=CSV_MIME
             )
 
-
-
+# Время отрисовки страницы
+registry.observe("page_render", time.perf_counter() - page_started, page=page)
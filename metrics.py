@@ -0,0 +1,185 @@
+"""
+Легковесные метрики в формате Prometheus: счетчики, гистограммы времени и внешние показатели
+(кэши, клиент НБРБ, bcrypt). Запись метрики - взятие блокировки и несколько сложений, поэтому
+инструментирование можно оставлять включенным под нагрузкой.
+Экспорт: HTTP-эндпоинт /metrics на порту metrics_port (если задан) или текст через render().
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм времени, секунды
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Registry:
+    """
+    Хранилище метрик процесса.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def add_collector(self, collector):
+        """
+        Добавить функцию, возвращающую {имя метрики: значение} в момент экспорта.
+        """
+        self.collectors.append(collector)
+
+    def render(self):
+        """
+        Текст метрик в формате Prometheus.
+        """
+        lines = []
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self.histograms.items()}
+
+        for (name, labels), value in sorted(counters.items()):
+            lines.append(f"{name}_total{_labels_text(labels)} {value}")
+
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket_count
+                lines.append(f"{name}_seconds_bucket{_labels_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_seconds_sum{_labels_text(labels)} {total}")
+            lines.append(f"{name}_seconds_count{_labels_text(labels)} {count}")
+
+        for collector in self.collectors:
+            try:
+                for name, value in collector().items():
+                    lines.append(f"{name} {value}")
+            except Exception as e:
+                lines.append(f"# сбор метрик не удался: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Замер времени блока with в гистограмму name.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - started, **labels)
+
+
+def timed(name, **labels):
+    """
+    Декоратор: время каждого вызова функции в гистограмму name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None):
+    """
+    Запустить эндпоинт /metrics один раз на процесс (порт из metrics_port, если не передан).
+    """
+    global _server
+    port = port or os.getenv("metrics_port")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+            except OSError as e:
+                print(f"Не удалось запустить эндпоинт метрик: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
+
+
+_dump_thread = None
+
+
+def start_metrics_dump(path=None, interval=None):
+    """
+    Периодически записывать метрики в файл (например, для textfile-коллектора node_exporter).
+    Параметры по умолчанию берутся из metrics_dump и metrics_dump_interval. Запускается один раз на процесс.
+    """
+    global _dump_thread
+    path = path or os.getenv("metrics_dump")
+    if not path:
+        return None
+    interval = interval or int(os.getenv("metrics_dump_interval", 60))
+
+    def dump():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                    f.write(registry.render())
+                os.replace(f"{path}.tmp", path)
+            except OSError as e:
+                print(f"Не удалось записать метрики: {e}")
+
+    with _server_lock:
+        if _dump_thread is None:
+            _dump_thread = threading.Thread(target=dump, name="metrics-dump", daemon=True)
+            _dump_thread.start()
+    return _dump_thread
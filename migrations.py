@@ -0,0 +1,158 @@
+"""
+Версионные миграции схемы MySQL. Примененные версии записываются в таблицу schema_migrations,
+при запуске применяются только новые, по порядку. Одновременный запуск из нескольких процессов
+сериализуется блокировкой GET_LOCK, поэтому миграции можно запускать при старте каждого процесса.
+Запуск отдельно: python migrations.py (или python migrations.py --status).
+"""
+import argparse
+import os
+
+import pymysql
+
+# (версия, описание, запросы). Примененную миграцию не меняют - изменения схемы добавляются новой версией
+MIGRATIONS = [
+    (1, "users", [
+        """
+        CREATE TABLE IF NOT EXISTS `users` (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (2, "sessions", [
+        # В таблице хранится SHA-256 токена, а не сам токен: утечка таблицы не дает войти в чужую сессию
+        """
+        CREATE TABLE IF NOT EXISTS `sessions` (
+            token_hash CHAR(64) NOT NULL PRIMARY KEY,
+            user_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            INDEX sessions_expires (expires_at),
+            INDEX sessions_user (user_id),
+            CONSTRAINT sessions_user_fk FOREIGN KEY (user_id) REFERENCES `users` (id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (3, "saved_queries", [
+        # Сохраненный запрос: набор инструментов, период (фиксированный или последние range_days дней)
+        # и выбранные показатели
+        """
+        CREATE TABLE IF NOT EXISTS `saved_queries` (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            instruments JSON NOT NULL,
+            start_date DATE NULL,
+            end_date DATE NULL,
+            range_days INT NULL,
+            statistics JSON NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY saved_queries_user_name (user_id, name),
+            CONSTRAINT saved_queries_user_fk FOREIGN KEY (user_id) REFERENCES `users` (id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (4, "dashboard_snapshots", [
+        # Готовый результат сохраненного запроса: статистика, ряды (CSV) и график (PNG),
+        # пересчитывается фоновой синхронизацией после публикации новых данных
+        """
+        CREATE TABLE IF NOT EXISTS `dashboard_snapshots` (
+            query_id INT NOT NULL PRIMARY KEY,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            statistics JSON NOT NULL,
+            failed_windows INT NOT NULL DEFAULT 0,
+            chart MEDIUMBLOB NULL,
+            series MEDIUMBLOB NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            CONSTRAINT dashboard_snapshots_query_fk FOREIGN KEY (query_id) REFERENCES `saved_queries` (id)
+                ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+]
+
+LOCK_NAME = "bank_rate_migrations"
+LOCK_TIMEOUT = 60
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS `schema_migrations` (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("SELECT version FROM `schema_migrations`")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def migrate(db):
+    """
+    Применить недостающие миграции через пул подключений объекта MySQL. Возвращает список примененных версий.
+    DDL в MySQL фиксируется неявно, поэтому версия записывается сразу после своих запросов:
+    прерванная миграция повторяется целиком, и ее запросы должны быть повторяемыми (IF NOT EXISTS).
+    """
+    applied = []
+    with db.pool.connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cursor.fetchone()['locked']:
+            raise RuntimeError("Не удалось получить блокировку миграций")
+        try:
+            done = applied_versions(cursor)
+            for version, name, statements in MIGRATIONS:
+                if version in done:
+                    continue
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute("INSERT INTO `schema_migrations` (version, name) VALUES (%s, %s)", (version, name))
+                connection.commit()
+                applied.append(version)
+                print(f"Миграция {version} ({name}) применена.")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    return applied
+
+
+def status(db):
+    """
+    Список (версия, описание, применена ли).
+    """
+    with db.pool.connection() as connection, connection.cursor() as cursor:
+        done = applied_versions(cursor)
+        connection.commit()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+def main():
+    from DB import MySQL
+
+    parser = argparse.ArgumentParser(description="Миграции схемы MySQL")
+    parser.add_argument("--status", action="store_true", help="показать состояние миграций и выйти")
+    args = parser.parse_args()
+
+    db = MySQL(
+        host=os.getenv("host"),
+        port=int(os.getenv("port", 3306)),
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        db_name=os.getenv("database"),
+    )
+    try:
+        if args.status:
+            for version, name, done in status(db):
+                print(f"{version:4d}  {'+' if done else '-'}  {name}")
+        else:
+            applied = migrate(db)
+            print(f"Применено миграций: {len(applied)}")
+    except pymysql.MySQLError as e:
+        print(f"Ошибка миграции: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Клиент API НБРБ на asyncio: единая точка доступа ко всем запросам наверх.
+Одинаковые одновременные запросы объединяются в один (single-flight), общее число запросов
+ограничивается глобальным лимитом частоты, сбойные запросы повторяются с экспоненциальной задержкой.
+Цикл событий работает в отдельном потоке, синхронный фасад (get, get_many) вызывается из Streamlit как обычно.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import registry
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов: ведро токенов с пополнением rate токенов в секунду.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NBRBClient:
+    """
+    Асинхронный клиент с объединением одинаковых запросов и глобальным лимитом частоты.
+    Сам HTTP-вызов выполняется через общую requests.Session с пулом соединений
+    в ограниченном пуле потоков цикла событий, поэтому новых зависимостей не требуется.
+    """
+    def __init__(self, concurrency=8, rate_limit=20.0, retries=3, backoff=0.5, timeout=30):
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=concurrency))
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=concurrency))
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="nbrb"))
+        self.thread = threading.Thread(target=self.loop.run_forever, name="nbrb-client", daemon=True)
+        self.thread.start()
+
+        self.limiter = asyncio.run_coroutine_threadsafe(self._create_limiter(rate_limit), self.loop).result()
+        self.in_flight = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    @staticmethod
+    async def _create_limiter(rate_limit):
+        # asyncio.Lock должен создаваться внутри цикла клиента
+        return RateLimiter(rate_limit, burst=max(1, int(rate_limit)))
+
+    async def fetch(self, url, start_date, end_date):
+        """
+        Данные за диапазон дат или None при ошибке. Повторный запрос того же диапазона,
+        пока первый еще выполняется, ждет его результата и не уходит наверх.
+        """
+        key = (url, start_date.isoformat(), end_date.isoformat())
+        task = self.in_flight.get(key)
+        if task is None:
+            task = self.loop.create_task(self._fetch_upstream(url, start_date, end_date))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def fetch_many(self, requests_list):
+        return await asyncio.gather(*(self.fetch(url, start, end) for url, start, end in requests_list))
+
+    async def _fetch_upstream(self, url, start_date, end_date):
+        params = {"startDate": start_date.isoformat(), "endDate": end_date.isoformat()}
+        for attempt in range(self.retries):
+            await self.limiter.acquire()
+            self.upstream_calls += 1
+            started = time.perf_counter()
+            try:
+                response = await self.loop.run_in_executor(
+                    None, lambda: self.session.get(url, params=params, timeout=self.timeout)
+                )
+                registry.observe("nbrb_upstream", time.perf_counter() - started)
+                registry.inc("nbrb_upstream_responses", status=response.status_code)
+                if response.status_code == 200:
+                    return response.json() or []
+                # Ошибки запроса (кроме превышения лимита) повторять бессмысленно
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    return None
+            except (requests.RequestException, ValueError):
+                registry.inc("nbrb_upstream_errors")
+            if attempt < self.retries - 1:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        return None
+
+    def get(self, url, start_date, end_date):
+        """
+        Синхронный фасад для fetch.
+        """
+        return asyncio.run_coroutine_threadsafe(self.fetch(url, start_date, end_date), self.loop).result()
+
+    def get_many(self, requests_list):
+        """
+        Синхронный фасад для fetch_many: список (url, начало, конец) -> список результатов в том же порядке.
+        """
+        if not requests_list:
+            return []
+        return asyncio.run_coroutine_threadsafe(self.fetch_many(requests_list), self.loop).result()
+
+    def stats(self):
+        return {"upstream_calls": self.upstream_calls, "coalesced": self.coalesced, "in_flight": len(self.in_flight)}
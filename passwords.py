@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from metrics import registry
+
+
+class PasswordHasher:
+    """
+    Хэширование и проверка паролей bcrypt в отдельном ограниченном пуле потоков.
+    bcrypt отпускает GIL, поэтому вычисления идут параллельно и не блокируют остальные сессии,
+    а размер пула ограничивает одновременную нагрузку на процессор.
+    """
+    def __init__(self, rounds=12, workers=2):
+        self.rounds = rounds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _submit(self, operation, function, *args):
+        submitted = time.perf_counter()
+
+        def timed_call():
+            started = time.perf_counter()
+            result = function(*args)
+            self._record(operation, started - submitted, time.perf_counter() - started)
+            return result
+
+        return self.executor.submit(timed_call)
+
+    def _run(self, operation, function, *args):
+        return self._submit(operation, function, *args).result()
+
+    def _record(self, operation, wait, duration):
+        registry.observe("bcrypt", duration, operation=operation)
+        registry.observe("bcrypt_queue_wait", wait, operation=operation)
+        with self.lock:
+            metric = self.metrics.setdefault(
+                operation, {"count": 0, "total": 0.0, "max": 0.0, "wait_total": 0.0}
+            )
+            metric["count"] += 1
+            metric["total"] += duration
+            metric["max"] = max(metric["max"], duration)
+            metric["wait_total"] += wait
+
+    def hash(self, password):
+        """
+        Хэширование пароля с текущим значением стоимости (rounds).
+        """
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run("hash", bcrypt.hashpw, password.encode('utf-8'), salt)
+
+    def hash_many(self, passwords):
+        """
+        Хэширование списка паролей во всех потоках пула одновременно, порядок результатов сохраняется.
+        """
+        futures = [
+            self._submit("hash", bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds))
+            for password in passwords
+        ]
+        return [future.result() for future in futures]
+
+    def verify(self, password, hashed_password):
+        """
+        Проверка пароля по сохраненному хэшу.
+        """
+        return self._run("verify", bcrypt.checkpw, password.encode('utf-8'), hashed_password)
+
+    def needs_rehash(self, hashed_password):
+        """
+        Проверить, отличается ли стоимость сохраненного хэша от текущей настройки.
+        """
+        try:
+            return int(hashed_password.split(b'$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self):
+        """
+        Задержки по операциям: количество, среднее и максимальное время, среднее ожидание в очереди (секунды).
+        """
+        with self.lock:
+            return {
+                operation: {
+                    "count": metric["count"],
+                    "avg": metric["total"] / metric["count"],
+                    "max": metric["max"],
+                    "avg_wait": metric["wait_total"] / metric["count"],
+                }
+                for operation, metric in self.metrics.items()
+            }
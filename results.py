@@ -0,0 +1,90 @@
+"""
+Результаты анализа в пределах сессии Streamlit: загруженный ряд, статистика и готовые файлы выгрузки
+по ключу (инструмент, начало, конец). Любое изменение виджета перезапускает скрипт, и без этого хранилища
+результаты пропадали бы до повторного нажатия кнопки, а повторное нажатие заново делало всю работу.
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+MAX_BYTES = int(os.getenv("session_results_mb", 16)) * 1024 * 1024
+MAX_ENTRIES = int(os.getenv("session_results_max", 8))
+
+
+def result_size(result):
+    """
+    Приблизительный размер результата: массивы ряда и байты файлов выгрузки.
+    """
+    size = 0
+    for value in result.values():
+        if isinstance(value, np.ndarray):
+            size += value.nbytes
+        elif isinstance(value, bytes):
+            size += len(value)
+        elif isinstance(value, dict):
+            size += result_size(value)
+    return size
+
+
+class ResultStore:
+    """
+    LRU результатов одной сессии с ограничением по памяти и числу записей.
+    """
+    def __init__(self, max_bytes=MAX_BYTES, max_entries=MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+        return result
+
+    def set(self, key, result):
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= self.sizes[key]
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        self.sizes[key] = size
+        self.size += size
+        while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+            removed, _ = self.entries.popitem(last=False)
+            self.size -= self.sizes.pop(removed)
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.size = 0
+
+
+def session_results():
+    """
+    Хранилище результатов текущей сессии (создается при первом обращении).
+    """
+    if "results" not in st.session_state:
+        st.session_state.results = ResultStore()
+    return st.session_state.results
+
+
+def memoized(key, compute):
+    """
+    Результат по ключу из хранилища сессии; при отсутствии вычисляется compute() и сохраняется (кроме None).
+    """
+    results = session_results()
+    result = results.get(key)
+    if result is None:
+        result = compute()
+        if result is not None:
+            results.set(key, result)
+    return result
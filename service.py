@@ -0,0 +1,296 @@
+"""
+Аналитический сервис без Streamlit: загрузка рядов НБРБ, статистика и файлы выгрузки.
+Функции возвращают данные и список окон дат, которые не удалось загрузить, и ничего не выводят.
+Вывод на страницы - в API.py (Streamlit), по HTTP - в http_api.py, фоновая синхронизация - в sync.py.
+"""
+import math
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+from DB import RatesStore
+from cache import ResponseCache
+from nbrb_client import NBRBClient
+from metrics import registry, timed
+from stats_engine import summarize, rolling_statistics
+
+# Локальное хранилище уже загруженных рядов
+store = RatesStore(os.getenv("nbrb_store", "nbrb_store.sqlite3"))
+
+# Клиент API НБРБ, общий для всех сессий: пул соединений, объединение одинаковых запросов, лимит частоты
+client = NBRBClient(
+    concurrency=int(os.getenv("nbrb_workers", 8)),
+    rate_limit=float(os.getenv("nbrb_rate_limit", 20)),
+    retries=int(os.getenv("nbrb_retries", 3)),
+)
+
+# Ресурсы API для металлов и валют (адрес API можно заменить, например, на локальный стенд)
+NBRB_API = os.getenv("nbrb_api", "https://api.nbrb.by").rstrip("/")
+METAL_URLS = {
+    "Золото": f"{NBRB_API}/bankingots/prices/0",
+    "Серебро": f"{NBRB_API}/bankingots/prices/1",
+    "Платина": f"{NBRB_API}/bankingots/prices/2",
+    "Палладий": f"{NBRB_API}/bankingots/prices/3",
+}
+CURRENCY_URLS = {
+    "Доллары (USD)": f"{NBRB_API}/exrates/rates/dynamics/431",
+    "Евро (EUR)": f"{NBRB_API}/exrates/rates/dynamics/451",
+    "Российские рубли (RUB)": f"{NBRB_API}/exrates/rates/dynamics/456",
+}
+# Все инструменты: название -> (URL ресурса API, поле значения)
+INSTRUMENTS = {
+    **{name: (url, "Value") for name, url in METAL_URLS.items()},
+    **{name: (url, "Cur_OfficialRate") for name, url in CURRENCY_URLS.items()},
+}
+
+# Кэш ответов API, общий для всех сессий (и процессов, если задан cache_path)
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("cache_max_mb", 64)) * 1024 * 1024,
+    recent_ttl=int(os.getenv("cache_recent_ttl", 300)),
+    path=os.getenv("cache_path"),
+)
+
+
+# Счетчики кэша ответов API
+def cache_stats():
+    return response_cache.stats()
+
+
+# Показатели кэшей и клиента НБРБ для эндпоинта метрик
+def collect_metrics():
+    response = cache_stats()
+    client_stats = client.stats()
+    metrics = {
+        "nbrb_cache_hits_total": response["hits"] + response["shared_hits"],
+        "nbrb_cache_misses_total": response["misses"],
+        "nbrb_cache_evictions_total": response["evictions"],
+        "nbrb_cache_bytes": response["bytes"],
+        "nbrb_upstream_calls_total": client_stats["upstream_calls"],
+        "nbrb_coalesced_requests_total": client_stats["coalesced"],
+        "nbrb_in_flight_requests": client_stats["in_flight"],
+    }
+    # Кэш графиков есть только в процессах, которые рисуют (Streamlit), сервис его не загружает
+    charts = sys.modules.get("charts")
+    if charts is not None:
+        charts_stats = charts.chart_cache.stats()
+        metrics.update({
+            "chart_cache_hits_total": charts_stats["hits"],
+            "chart_cache_misses_total": charts_stats["misses"],
+            "chart_cache_bytes": charts_stats["bytes"],
+        })
+    return metrics
+
+
+registry.add_collector(collect_metrics)
+
+
+# Вспомогательная функция для разделения диапазона дат (окна включают обе границы)
+def split_date_range(start_date, end_date, max_days=365):
+    current_date = start_date
+    while current_date <= end_date:
+        next_date = min(current_date + timedelta(days=max_days - 1), end_date)
+        yield current_date, next_date
+        current_date = next_date + timedelta(days=1)
+
+# Запрос данных за одно окно дат (через кэш ответов), при ошибке возвращает None
+def fetch_chunk(api_url, chunk_start, chunk_end):
+    return fetch_requests([(api_url, chunk_start, chunk_end)])[0]
+
+# Пакетный запрос списка (url, начало, конец): ответы из кэша, остальное одним пакетом через клиент
+@timed("api_call", function="fetch_requests")
+def fetch_requests(requests_list):
+    results = [response_cache.get(*request) for request in requests_list]
+    missing = [index for index, result in enumerate(results) if result is None]
+    for index, data in zip(missing, client.get_many([requests_list[index] for index in missing])):
+        if data is not None:
+            response_cache.set(*requests_list[index], data)
+        results[index] = data
+    return results
+
+# Параллельный запрос списка окон дат, результаты возвращаются в порядке окон
+def fetch_windows(api_url, windows):
+    results = fetch_requests([(api_url, start, end) for start, end in windows])
+    return list(zip(windows, results))
+
+# Ответ API за диапазон дат без хранилища: (записи, окна с ошибкой)
+@timed("api_call", function="fetch_data_in_chunks")
+def fetch_data_in_chunks(api_url, start_date, end_date, data_key):
+    all_data = []
+    failed = []
+    for window, data in fetch_windows(api_url, list(split_date_range(start_date, end_date))):
+        if data is None:
+            failed.append(window)
+        else:
+            all_data.extend(data)
+    return all_data, failed
+
+# Ряд из локального хранилища с догрузкой недостающих диапазонов из API: (ряд, окна с ошибкой)
+@timed("api_call", function="load_series")
+def load_series(api_url, start_date, end_date, data_key):
+    windows = [
+        window
+        for missing_start, missing_end in store.missing_ranges(api_url, start_date, end_date)
+        for window in split_date_range(missing_start, missing_end)
+    ]
+    failed = []
+    saved = []
+    for (chunk_start, chunk_end), data in fetch_windows(api_url, windows):
+        if data is None:
+            failed.append((chunk_start, chunk_end))
+        else:
+            # Агрегаты пересчитываются, только если появились новые или изменившиеся значения
+            if store.save(api_url, chunk_start, chunk_end, data, data_key):
+                saved.append(chunk_start)
+    if saved:
+        refresh_aggregates(api_url, min(saved))
+    dates, values = store.load(api_url, start_date, end_date)
+    return normalize_series(dates, values), failed
+
+# Несколько рядов за один диапазон, недостающие окна всех инструментов загружаются одним пакетом:
+# ({название: ряд}, окна с ошибкой в виде (название, начало, конец))
+@timed("api_call", function="load_many_series")
+def load_many_series(names, start_date, end_date):
+    jobs = [
+        (name, window)
+        for name in names
+        for missing_start, missing_end in store.missing_ranges(INSTRUMENTS[name][0], start_date, end_date)
+        for window in split_date_range(missing_start, missing_end)
+    ]
+    results = fetch_requests([(INSTRUMENTS[name][0], *window) for name, window in jobs])
+    failed = []
+    saved = {}
+    for (name, (chunk_start, chunk_end)), data in zip(jobs, results):
+        url, value_key = INSTRUMENTS[name]
+        if data is None:
+            failed.append((name, chunk_start, chunk_end))
+        else:
+            if store.save(url, chunk_start, chunk_end, data, value_key):
+                saved[url] = min(saved.get(url, chunk_start), chunk_start)
+    for url, changed_from in saved.items():
+        refresh_aggregates(url, changed_from)
+    series = {name: normalize_series(*store.load(INSTRUMENTS[name][0], start_date, end_date)) for name in names}
+    return series, failed
+
+# Пересчет материализованных агрегатов (aggregates.py) после сохранения новых дней
+@timed("api_call", function="refresh_aggregates")
+def refresh_aggregates(api_url, changed_from):
+    from aggregates import refresh
+    return refresh(api_url, changed_from)
+
+# Дата деноминации: значения до 1 июля 2016 года делятся на 10000
+REDENOMINATION_DATE = np.datetime64("2016-07-01")
+
+# Приведение ряда к столбцам: даты datetime64[D] и значения float64 с учетом деноминации
+def normalize_series(dates, values):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    values = np.asarray(values, dtype=np.float64)
+    values = np.where(dates < REDENOMINATION_DATE, values / 10000, values)
+    return {"dates": dates, "values": values}
+
+# Приведение ответа API к столбцам
+def parse_response(data, value_key):
+    return normalize_series([item['Date'][:10] for item in data], [item[value_key] for item in data])
+
+# Получение последней доступной котировки одним запросом за период lookback_days
+# (ответ за свежий период хранится в кэше ответов с коротким сроком жизни)
+@timed("api_call", function="get_latest_quote")
+def get_latest_quote(api_url, value_key, lookback_days):
+    today = date.today()
+    data = fetch_chunk(api_url, today - timedelta(days=lookback_days - 1), today)
+    if not data:
+        return None, None
+    points = [item for item in data if item.get(value_key) is not None]
+    if not points:
+        return None, None
+    latest = max(points, key=lambda item: item['Date'])
+    return date.fromisoformat(latest['Date'][:10]), latest[value_key]
+
+# Получение ближайшей доступной цены
+def get_nearest_price(api_url, value_key):
+    _, price = get_latest_quote(api_url, value_key, lookback_days=7)
+    return price
+
+# Сводная статистика и скользящие показатели за последнее окно
+# (для последнего окна достаточно window + 1 последних точек, а не всей истории)
+@timed("api_call", function="series_statistics")
+def series_statistics(values, window=30):
+    summary = summarize(values)
+    moving_average, volatility = rolling_statistics(values[-(window + 1):], window)
+    return {
+        "mean": summary.mean,
+        "median": summary.median,
+        "maximum": summary.maximum,
+        "minimum": summary.minimum,
+        "window": window,
+        "moving_average": float(moving_average[-1]),
+        "volatility": float(volatility[-1]),
+    }
+
+# Значение показателя для JSON: NaN и бесконечности (например, скользящее среднее короткого ряда)
+# не представимы в JSON и передаются как null
+def json_safe(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+# Статистика за стандартные периоды из материализованных агрегатов
+def range_statistics(name):
+    from aggregates import range_statistics as stored_range_statistics
+    return stored_range_statistics(INSTRUMENTS[name][0])
+
+# Недельные ('week') или месячные ('month') OHLC из материализованных агрегатов
+def ohlc(name, period, start_date, end_date):
+    return store.load_ohlc(INSTRUMENTS[name][0], period, start_date, end_date)
+
+# Скользящее среднее за window наблюдений из материализованных агрегатов: (даты, значения)
+def rolling_means(name, window, start_date, end_date):
+    return store.load_rolling_means(INSTRUMENTS[name][0], window, start_date, end_date)
+
+# Функция для создания Excel файла
+@timed("api_call", function="create_excel_file")
+def create_excel_file(data, mean, median, metal_choice=None, currency_group=None):
+    from export import excel_bytes, STAT_LABELS
+    statistics = {STAT_LABELS['mean']: mean, STAT_LABELS['median']: median}
+    return excel_bytes(
+        {"Данные": data},
+        statistics={"Данные": statistics},
+        value_label="Цена" if metal_choice else "Курс",
+    )
+
+# Форматы выгрузки: расширение -> MIME-тип
+def export_formats():
+    from export import EXCEL_MIME, CSV_MIME, PARQUET_MIME
+    return {"xlsx": EXCEL_MIME, "csv": CSV_MIME, "parquet": PARQUET_MIME}
+
+# Файл выгрузки ряда инструмента в формате fmt ("xlsx", "csv" или "parquet")
+@timed("api_call", function="export_file")
+def export_file(name, series, statistics, fmt):
+    from export import csv_bytes, parquet_bytes
+    if fmt == "xlsx":
+        metal_choice, currency_group = (name, None) if name in METAL_URLS else (None, name)
+        return create_excel_file(series, statistics["mean"], statistics["median"],
+                                 metal_choice=metal_choice, currency_group=currency_group)
+    if fmt == "csv":
+        return csv_bytes({name: series})
+    if fmt == "parquet":
+        return parquet_bytes({name: series})
+    raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+# Анализ инструмента за период: {"series", "statistics" (None, если данных нет), "failed"}
+@timed("api_call", function="analyze")
+def analyze(name, start_date, end_date):
+    url, value_key = INSTRUMENTS[name]
+    series, failed = load_series(url, start_date, end_date, value_key)
+    statistics = series_statistics(series["values"]) if series["values"].size else None
+    return {"series": series, "statistics": statistics, "failed": failed}
+
+# Результат анализа вместе с готовыми файлами всех форматов выгрузки (для хранения в результатах сессии)
+@timed("api_call", function="build_result")
+def build_result(name, start_date, end_date):
+    result = analyze(name, start_date, end_date)
+    if result["statistics"] is not None:
+        for fmt in ("xlsx", "csv", "parquet"):
+            result[fmt] = export_file(name, result["series"], result["statistics"], fmt)
+    return result
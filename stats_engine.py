@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Сжатое представление распределения для приближенных квантилей (медиана, квартили).
+    Хранит не больше capacity центроидов (среднее значение и вес), пока точек не больше
+    capacity, квантили точные. Новые значения добавляются пачками без повторного просмотра истории.
+    """
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(values.size)])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        if means.size > self.capacity:
+            # Делим отсортированные точки на capacity групп равного веса и заменяем каждую центроидом
+            cumulative = np.cumsum(weights) - weights
+            buckets = (cumulative / weights.sum() * self.capacity).astype(np.int64)
+            bucket_weights = np.bincount(buckets, weights=weights)
+            bucket_sums = np.bincount(buckets, weights=weights * means)
+            filled = bucket_weights > 0
+            means = bucket_sums[filled] / bucket_weights[filled]
+            weights = bucket_weights[filled]
+
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        if not self.weights.size:
+            return math.nan
+        total = self.weights.sum()
+        positions = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, positions, self.means))
+
+
+class SummaryStatistics:
+    """
+    Сводная статистика ряда за один проход: количество, среднее, дисперсия, минимум, максимум
+    и квантили из QuantileSketch. Обновляется инкрементально по мере поступления новых точек.
+    """
+    def __init__(self, sketch_capacity=1000):
+        self.count = 0
+        self.mean = math.nan
+        self.m2 = 0.0
+        self.minimum = math.nan
+        self.maximum = math.nan
+        self.sketch = QuantileSketch(sketch_capacity)
+
+    def update(self, values):
+        """
+        Добавить значение или массив значений.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return self
+        batch_count = values.size
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+
+        if self.count:
+            # Объединение моментов по формуле Чана
+            total = self.count + batch_count
+            delta = batch_mean - self.mean
+            self.mean += delta * batch_count / total
+            self.m2 += batch_m2 + delta ** 2 * self.count * batch_count / total
+            self.minimum = min(self.minimum, float(values.min()))
+            self.maximum = max(self.maximum, float(values.max()))
+            self.count = total
+        else:
+            self.count = batch_count
+            self.mean = batch_mean
+            self.m2 = batch_m2
+            self.minimum = float(values.min())
+            self.maximum = float(values.max())
+
+        self.sketch.update(values)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        return min(max(self.sketch.quantile(q), self.minimum), self.maximum)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else math.nan
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'median': self.median,
+            'maximum': self.maximum,
+            'minimum': self.minimum,
+            'std': self.std,
+            'q25': self.quantile(0.25),
+            'q75': self.quantile(0.75),
+        }
+
+
+def summarize(values):
+    """
+    Вычислить сводную статистику массива значений.
+    """
+    return SummaryStatistics().update(values)
+
+
+def rolling_statistics(values, window=30):
+    """
+    Скользящее среднее значений и волатильность (стандартное отклонение дневных относительных
+    изменений) за окно window. Считается через накопленные суммы за O(n), первые точки - NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    moving_average = np.full(values.size, np.nan)
+    volatility = np.full(values.size, np.nan)
+    if values.size >= window:
+        sums = np.cumsum(np.concatenate([[0.0], values]))
+        moving_average[window - 1:] = (sums[window:] - sums[:-window]) / window
+    if values.size > window:
+        returns = np.diff(values) / values[:-1]
+        sums = np.cumsum(np.concatenate([[0.0], returns]))
+        squares = np.cumsum(np.concatenate([[0.0], returns ** 2]))
+        window_mean = (sums[window:] - sums[:-window]) / window
+        window_var = (squares[window:] - squares[:-window]) / window - window_mean ** 2
+        volatility[window:] = np.sqrt(np.maximum(window_var, 0.0))
+    return moving_average, volatility
@@ -0,0 +1,130 @@
+"""
+Фоновая синхронизация рядов НБРБ в локальное хранилище.
+При первом запуске загружает историю с sync_backfill_from, затем раз в sync_interval секунд
+догружает новые дни по всем инструментам, чтобы страницы читали уже готовые данные.
+Если задано подключение к MySQL (host), после прохода пересчитываются снимки сохраненных дашбордов,
+затронутых новыми данными (dashboards.py).
+Запуск: python sync.py (или python sync.py --once для одного прохода).
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+from service import INSTRUMENTS, store, split_date_range, fetch_windows
+from aggregates import refresh
+
+BACKFILL_FROM = date.fromisoformat(os.getenv("sync_backfill_from", "2010-01-01"))
+SYNC_INTERVAL = int(os.getenv("sync_interval", 900))
+
+
+def sync_instrument(url, value_key, today):
+    """
+    Догрузить недостающие дни одного инструмента.
+    НБРБ публикует курс на следующий день заранее, поэтому запрашиваем и завтрашнюю дату.
+    """
+    windows = [
+        window
+        for missing_start, missing_end in store.missing_ranges(url, BACKFILL_FROM, today + timedelta(days=1))
+        for window in split_date_range(missing_start, missing_end)
+    ]
+    rows_written = 0
+    failed = []
+    saved = []
+    for (chunk_start, chunk_end), data in fetch_windows(url, windows):
+        if data is None:
+            failed.append((chunk_start, chunk_end))
+        else:
+            written = store.save(url, chunk_start, chunk_end, data, value_key)
+            if written:
+                rows_written += written
+                saved.append(chunk_start)
+
+    # Агрегаты пересчитываются только с первого нового или изменившегося дня
+    aggregates = refresh(url, min(saved)) if saved else None
+    latest = store.latest_date(url)
+    return {
+        "windows": len(windows),
+        "rows_written": rows_written,
+        # Первый день окна, в котором появились новые или изменились прежние значения (None - изменений нет)
+        "changed_from": min(saved) if saved else None,
+        "aggregates": aggregates,
+        "failed": failed,
+        "latest": latest,
+        # Курс на завтра публикуется заранее, такое опережение - не отставание
+        "lag_days": max(0, (today - latest).days) if latest else None,
+    }
+
+
+def sync_all():
+    """
+    Один проход синхронизации по всем инструментам с отчетом.
+    """
+    today = date.today()
+    started = time.perf_counter()
+    reports = {}
+    for name, (url, value_key) in INSTRUMENTS.items():
+        try:
+            reports[name] = sync_instrument(url, value_key, today)
+        except Exception as e:
+            reports[name] = {"error": str(e)}
+
+    for name, report in reports.items():
+        if "error" in report:
+            print(f"{name}: ошибка синхронизации: {report['error']}")
+            continue
+        print(f"{name}: записано строк {report['rows_written']}, последняя дата {report['latest']}, "
+              f"отставание {report['lag_days']} дн., ошибок {len(report['failed'])}")
+    print(f"Синхронизация завершена за {time.perf_counter() - started:.1f} с.")
+    return reports
+
+
+def refresh_dashboards(db, reports):
+    """
+    Пересчитать снимки дашбордов по инструментам, в которых появились новые или изменились прежние значения.
+    """
+    from dashboards import refresh_snapshots
+
+    changed = {name: report["changed_from"] for name, report in reports.items() if report.get("changed_from")}
+    started = time.perf_counter()
+    refreshed = refresh_snapshots(db, changed)
+    print(f"Дашборды: пересчитано снимков {refreshed} за {time.perf_counter() - started:.1f} с.")
+    return refreshed
+
+
+def database():
+    """
+    Подключение к MySQL для пересчета дашбордов или None, если оно не настроено.
+    """
+    if not os.getenv("host"):
+        return None
+    from DB import MySQL
+
+    db = MySQL(
+        host=os.getenv("host"),
+        port=int(os.getenv("port", 3306)),
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        db_name=os.getenv("database"),
+    )
+    db.migrate()
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синхронизация рядов НБРБ в локальное хранилище")
+    parser.add_argument("--once", action="store_true", help="выполнить один проход и завершиться")
+    args = parser.parse_args()
+
+    db = database()
+    while True:
+        reports = sync_all()
+        if db is not None:
+            refresh_dashboards(db, reports)
+        if args.once:
+            break
+        time.sleep(SYNC_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
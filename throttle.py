@@ -0,0 +1,64 @@
+"""
+Ограничение частоты неудачных попыток (входа) по ключу: email или IP-адрес клиента.
+Ключ блокируется, если за последние window секунд накопилось limit неудачных попыток,
+и разблокируется, когда самая старая из них выходит из окна.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class AttemptThrottle:
+    """
+    Скользящее окно неудачных попыток по ключам; число отслеживаемых ключей ограничено (LRU).
+    """
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.attempts = OrderedDict()
+
+    def _recent(self, key, now):
+        attempts = self.attempts.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self.attempts[key]
+            return None
+        return attempts
+
+    def retry_after(self, key):
+        """
+        Сколько секунд ключ еще заблокирован (0 - попытка разрешена).
+        """
+        if key is None or self.limit <= 0:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            attempts = self._recent(key, now)
+            if attempts is None or len(attempts) < self.limit:
+                return 0
+            return attempts[0] + self.window - now
+
+    def failure(self, key):
+        """
+        Отметить неудачную попытку.
+        """
+        if key is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            attempts = self._recent(key, now)
+            if attempts is None:
+                attempts = self.attempts[key] = deque(maxlen=max(self.limit, 1))
+            attempts.append(now)
+            self.attempts.move_to_end(key)
+            while len(self.attempts) > self.max_keys:
+                self.attempts.popitem(last=False)
+
+    def reset(self, key):
+        with self.lock:
+            self.attempts.pop(key, None)